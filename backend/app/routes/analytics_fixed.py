@@ -47,6 +47,8 @@ def get_timeline():
     try:
         qr_id = request.args.get('qr_id')
         timeline = get_scan_timeline(qr_id)
+        if timeline is None:
+            return jsonify({'error': 'Failed to load scan timeline'}), 500
         return jsonify(timeline)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,14 +1,25 @@
-from flask import Blueprint, request, jsonify
-import io
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import base64
-from PIL import Image
-import qrcode
-import cloudinary
-from app.utils.qr_utils import generate_qr_code, add_logo_to_qr, add_frame_and_text
-from app.utils.analytics_utils import log_qr_scan, get_analytics_data
+from datetime import datetime
+from app.utils.qr_utils import render_qr_image, decode_logo_data, IMAGE_MIMETYPES
+from app.utils.analytics_utils import log_qr_scan, get_analytics_data, get_scan_timeline, get_analytics_summary
+from app.utils.render_cache import render_cache, make_render_key
+from app.utils.logo_cache import logo_cache
+from app.utils.frame_templates import frame_templates
+from app.utils.device_utils import classifier_stats
+from app.utils.scan_queue import scan_queue
+from app.utils.export_utils import iter_export_scans, parse_export_fields, stream_scans_ndjson, stream_scans_csv, EXPORT_FORMATS
+from app.utils.upload_queue import upload_queue, UPLOAD_STATUS_MAX_WAIT
+from app.utils.batch_utils import render_batch, stream_ndjson, stream_zip, default_qr_id, BATCH_MAX_ITEMS
 
 qr_bp = Blueprint('qr', __name__)
 
+# Renders are content-addressed, so a given image id never changes
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Response types /generate can negotiate; JSON comes first so */* keeps the JSON response
+RESPONSE_TYPES = ['application/json', 'image/png', 'image/webp', 'image/svg+xml']
+
 @qr_bp.route('/generate', methods=['POST'])
 def generate():
     """Generate QR code with customization options"""
@@ -21,77 +32,187 @@ def generate():
         qr_data = data['data']
         options = data.get('options', {})
         
-        # Generate basic QR code
-        qr_img = generate_qr_code(
-            qr_data,
-            error_correction=options.get('error_correction', 'M'),
-            version=options.get('version'),
-            box_size=options.get('box_size', 10),
-            border=options.get('border', 4)
-        )
-        
-        # Add logo if provided
-        if options.get('logo'):
-            logo_options = options['logo']
-            logo_data = logo_options.get('data')
-            
-            if logo_data:
-                # Decode base64 logo data
-                logo_bytes = base64.b64decode(logo_data.split(',')[1] if ',' in logo_data else logo_data)
-                logo_img = Image.open(io.BytesIO(logo_bytes))
-                
-                # Add logo to QR code
-                qr_img = add_logo_to_qr(
-                    qr_img,
-                    logo_img,
-                    size_ratio=logo_options.get('size', 0.2),
-                    position=logo_options.get('position', 'center'),
-                    shape=logo_options.get('shape', 'square'),
-                    border=logo_options.get('border', True)
-                )
-        
-        # Add frame and text if provided
-        if options.get('frame'):
-            frame_options = options['frame']
-            qr_img = add_frame_and_text(
-                qr_img,
-                frame_color=frame_options.get('color', '#4CAF50'),
-                text=frame_options.get('text', ''),
-                text_color=frame_options.get('text_color', '#FFFFFF'),
-                frame_style=frame_options.get('style', 'square'),
-                frame_width=frame_options.get('width', 50)
-            )
+        # Pick JSON or a raw image body from the Accept header
+        response_type = request.accept_mimetypes.best_match(RESPONSE_TYPES, default='application/json')
+        image_format = options.get('format', 'png')
+        if image_format not in IMAGE_MIMETYPES:
+            return jsonify({'error': f'Unsupported format: {image_format}'}), 400
         
-        # Convert QR code to base64
-        buffered = io.BytesIO()
-        qr_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        # An explicit image Accept header wins over the format option
+        for format_name, mimetype in IMAGE_MIMETYPES.items():
+            if mimetype == response_type:
+                image_format = format_name
+        
+        # Decode base64 logo data up front so it can be part of the cache key
+        logo_bytes = decode_logo_data(options)
         
-        # Upload to Cloudinary if requested
-        cloudinary_url = None
+        # Serve identical renders straight from the cache
+        cache_key = make_render_key(qr_data, options, logo_bytes, image_format)
+        image_bytes = render_cache.get(cache_key, image_format)
+        cached = image_bytes is not None
+        
+        if not cached:
+            image_bytes = render_qr_image(qr_data, options, logo_bytes, image_format)
+            render_cache.set(cache_key, image_bytes, image_format)
+        
+        mimetype = IMAGE_MIMETYPES[image_format]
+        
+        # Queue a Cloudinary upload if requested; clients poll /upload/<upload_id>
+        upload = None
         if options.get('upload_to_cloud', False):
-            upload_result = cloudinary.uploader.upload(
-                f"data:image/png;base64,{img_str}",
-                folder="qr_codes"
-            )
-            cloudinary_url = upload_result['secure_url']
+            job = upload_queue.submit(image_bytes, folder="qr_codes", mimetype=mimetype)
+            if job:
+                upload = job.to_dict()
+            else:
+                upload = {'upload_id': None, 'status': 'rejected', 'error': 'Upload queue is full'}
         
         # Generate a unique ID for this QR code
-        qr_id = options.get('id', base64.urlsafe_b64encode(qr_data.encode()).decode()[:8])
+        qr_id = options.get('id', default_qr_id(qr_data))
         
         # Log QR code generation
         log_qr_scan(qr_id)
         
+        if response_type != 'application/json':
+            # Raw image body with the metadata carried in headers
+            response = image_response(image_bytes, mimetype, cache_key)
+            response.headers['X-QR-Id'] = qr_id
+            response.headers['X-QR-Image-Id'] = cache_key
+            response.headers['X-QR-Cached'] = str(cached).lower()
+            if upload:
+                response.headers['X-QR-Upload-Id'] = upload['upload_id'] or ''
+                response.headers['X-QR-Upload-Status'] = upload['status']
+            return response
+        
+        # Convert QR code to base64
+        img_str = base64.b64encode(image_bytes).decode('utf-8')
+        
         return jsonify({
             'id': qr_id,
             'data': qr_data,
-            'image': f"data:image/png;base64,{img_str}",
-            'cloudinary_url': cloudinary_url
+            'image': f"data:{mimetype};base64,{img_str}",
+            'image_id': cache_key,
+            'cloudinary_url': None,  # Uploads finish asynchronously, see 'upload'
+            'upload': upload,
+            'cached': cached
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@qr_bp.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Get the state of a queued Cloudinary upload"""
+    try:
+        job = upload_queue.get(upload_id)
+        if not job:
+            # Queued by another worker process; its last saved state is returned without waiting
+            state = upload_queue.find(upload_id)
+            if not state:
+                return jsonify({'error': 'Upload not found'}), 404
+            return jsonify(state)
+        
+        # Optionally long-poll until the upload settles, capped so a sync worker is not held for long
+        wait = min(request.args.get('wait', 0, type=float), UPLOAD_STATUS_MAX_WAIT)
+        if wait > 0:
+            job.done.wait(wait)
+        
+        return jsonify(job.to_dict())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/upload/stats', methods=['GET'])
+def upload_stats():
+    """Get upload queue depth and counters"""
+    try:
+        return jsonify(upload_queue.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/image/<image_id>.<image_format>', methods=['GET'])
+def image(image_id, image_format):
+    """Serve a cached render by its content id"""
+    try:
+        if image_format not in IMAGE_MIMETYPES:
+            return jsonify({'error': f'Unsupported format: {image_format}'}), 404
+        
+        # The id is the content hash, so a matching ETag never needs the cache
+        if image_id in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(image_id)
+            response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+            return response
+        
+        # The id already fixes the format; any other extension is not found
+        image_bytes = render_cache.get(image_id, image_format)
+        if image_bytes is None:
+            return jsonify({'error': 'Image not found'}), 404
+        
+        return image_response(image_bytes, IMAGE_MIMETYPES[image_format], image_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def image_response(image_bytes, mimetype, image_id):
+    """Build a raw image response that CDNs and browsers can revalidate"""
+    response = Response(image_bytes, mimetype=mimetype)
+    response.set_etag(image_id)
+    response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+    return response.make_conditional(request)
+
+@qr_bp.route('/batch', methods=['POST'])
+def batch():
+    """Generate QR codes for a list of items sharing an options template"""
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data.get('items'), list) or not data['items']:
+            return jsonify({'error': 'No items provided'}), 400
+        
+        items = data['items']
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many items (max {BATCH_MAX_ITEMS})'}), 400
+        
+        template = data.get('options', {})
+        output_format = data.get('format', 'ndjson')
+        
+        # The template logo is decoded once and shared by items without logo data of their own
+        logo_bytes = decode_logo_data(template)
+        results = render_batch(items, template, logo_bytes)
+        
+        if output_format == 'zip':
+            return Response(
+                stream_with_context(stream_zip(results)),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename=qr_codes.zip'}
+            )
+        
+        if output_format == 'ndjson':
+            return Response(stream_with_context(stream_ndjson(results)), mimetype='application/x-ndjson')
+        
+        return jsonify({'error': f'Unsupported format: {output_format}'}), 400
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Get scan ingestion queue depth, counters and flush latency"""
+    try:
+        return jsonify(scan_queue.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get render, logo, frame template and user agent cache hit/miss counters"""
+    try:
+        stats = render_cache.stats()
+        stats['logo'] = logo_cache.stats()
+        stats['frame'] = frame_templates.stats()
+        stats['user_agent'] = classifier_stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @qr_bp.route('/analytics', methods=['GET'])
 def analytics():
     """Get all QR code analytics data"""
@@ -110,6 +231,89 @@ def qr_analytics(qr_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@qr_bp.route('/analytics/timeline', methods=['GET'])
+@qr_bp.route('/analytics/<qr_id>/timeline', methods=['GET'])
+def timeline(qr_id=None):
+    """Get scan counts bucketed by hour, day or week"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        data = get_scan_timeline(qr_id, granularity, start, end, request.args.get('source', 'rollup'))
+        if data is None:
+            return jsonify({'error': 'Failed to load scan timeline'}), 500
+        return jsonify({'granularity': granularity, 'timeline': data})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/analytics/summary', methods=['GET'])
+@qr_bp.route('/analytics/<qr_id>/summary', methods=['GET'])
+def summary(qr_id=None):
+    """Get scan count, device breakdown and timeline in one response"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # Daily rollups by default; ?source=raw reads the scans themselves
+        data = get_analytics_summary(qr_id, granularity, start, end, request.args.get('source', 'rollup'))
+        if data is None:
+            return jsonify({'error': 'Failed to load analytics summary'}), 500
+        data['granularity'] = granularity
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@qr_bp.route('/analytics/export', methods=['GET'])
+@qr_bp.route('/analytics/<qr_id>/export', methods=['GET'])
+def export(qr_id=None):
+    """Stream raw scans as NDJSON or CSV without loading them into memory"""
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f'Unsupported format: {export_format}'}), 400
+        
+        fields = parse_export_fields(request.args.get('fields'))
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        scans = iter_export_scans(qr_id, start, end, fields)
+        
+        if export_format == 'csv':
+            return Response(
+                stream_with_context(stream_scans_csv(scans, fields)),
+                mimetype=EXPORT_FORMATS['csv'],
+                headers={'Content-Disposition': 'attachment; filename=qr_scans.csv'}
+            )
+        
+        return Response(stream_with_context(stream_scans_ndjson(scans)), mimetype=EXPORT_FORMATS['ndjson'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_date_arg(name):
+    """Parse an optional ISO 8601 date query argument"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} date: {value}")
+
 @qr_bp.route('/scan/<qr_id>', methods=['GET'])
 def scan(qr_id):
     """Log a QR code scan"""
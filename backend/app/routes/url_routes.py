@@ -1,5 +1,11 @@
-from flask import Blueprint, request, jsonify, redirect
-from app.utils.shortener_utils import create_short_url, get_original_url, get_all_short_urls, update_original_url
+from flask import Blueprint, request, jsonify, redirect, Response, stream_with_context
+import json
+from app.utils.shortener_utils import create_short_url, get_original_url, update_original_url
+from app.utils.url_cache import redirect_cache, shorten_cache
+from app.utils.click_buffer import click_buffer
+from app.utils.shortener_providers import shortener_racer, shortener_client
+from app.utils.id_allocator import short_id_allocator
+from app.utils.db_utils import iter_urls, get_urls_page, decode_url_cursor, URL_PAGE_DEFAULT_LIMIT
 
 url_bp = Blueprint('url', __name__)
 
@@ -40,22 +46,112 @@ def redirect_to_url(short_id):
 
 @url_bp.route('/all', methods=['GET'])
 def get_all():
-    """Get all shortened URLs"""
+    """Get shortened URLs, paginated when limit or cursor is given"""
     try:
-        urls = get_all_short_urls()
-        
-        # Format the response
-        formatted_urls = []
-        for url in urls:
-            formatted_urls.append({
-                'short_id': url[0],
-                'original_url': url[1],
-                'created_at': url[2],
-                'scans': url[3],
-                'short_url': url[4]
+        if 'limit' in request.args or 'cursor' in request.args:
+            cursor = request.args.get('cursor')
+            if cursor:
+                try:
+                    decode_url_cursor(cursor)
+                except Exception:
+                    return jsonify({'error': 'Invalid cursor'}), 400
+            
+            urls, next_cursor = get_urls_page(
+                request.args.get('limit', URL_PAGE_DEFAULT_LIMIT, type=int),
+                cursor
+            )
+            
+            return jsonify({
+                'urls': [format_url(url) for url in urls],
+                'next_cursor': next_cursor
             })
         
-        return jsonify(formatted_urls)
+        # Unpaginated listing streams the JSON array straight from the cursor
+        def generate():
+            yield '['
+            for i, url in enumerate(iter_urls()):
+                yield (',' if i else '') + json.dumps(format_url(url), default=str)
+            yield ']'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def format_url(url):
+    """Shape a short URL document for the API"""
+    return {
+        'short_id': url.get('short_id'),
+        'original_url': url.get('original_url'),
+        'created_at': url.get('created_at'),
+        'scans': url.get('scans', 0),
+        'short_url': url.get('short_url')
+    }
+
+@url_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get redirect and shorten dedup cache hit/miss counters"""
+    try:
+        stats = redirect_cache.stats()
+        stats['shorten'] = shorten_cache.stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/clicks/stats', methods=['GET'])
+def click_stats():
+    """Get write-behind click buffer counters"""
+    try:
+        return jsonify(click_buffer.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/providers/stats', methods=['GET'])
+def provider_stats():
+    """Get per-provider latency and error counters for the external shorteners"""
+    try:
+        return jsonify(shortener_racer.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/ids/stats', methods=['GET'])
+def id_stats():
+    """Get short ID allocator counters"""
+    try:
+        return jsonify(short_id_allocator.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/http/stats', methods=['GET'])
+def http_stats():
+    """Get outbound HTTP request counters and connection reuse"""
+    try:
+        return jsonify({
+            'shortener': shortener_client.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/admin/providers', methods=['GET'])
+def provider_breakers():
+    """Get the circuit breaker state of each external shortener"""
+    try:
+        return jsonify({
+            provider.name: provider.breaker.stats()
+            for provider in shortener_racer.providers
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@url_bp.route('/admin/providers/<name>/reset', methods=['POST'])
+def reset_provider_breaker(name):
+    """Force a shortener's circuit breaker closed"""
+    try:
+        provider = shortener_racer.get(name)
+        if not provider:
+            return jsonify({'error': 'Provider not found'}), 404
+        
+        provider.breaker.reset()
+        return jsonify({provider.name: provider.breaker.stats()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
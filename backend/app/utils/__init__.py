@@ -1,6 +1,23 @@
 # Import utility modules
-from app.utils.db_utils import init_db_connection, store_scan, get_scans, store_url, get_url, get_all_urls, update_url
-from app.utils.qr_utils import generate_qr_code, add_logo_to_qr, add_frame_and_text, create_qr_for_type
-from app.utils.analytics_utils import log_qr_scan, get_analytics_data
+from app.utils.db_utils import init_db_connection, store_scan, insert_scan, make_scan_document, get_scans, record_scan_rollups, get_rollup_summary, rebuild_scan_rollups, get_scan_timeline_buckets, count_scans, get_scan_device_counts, get_scan_summary, store_url, get_url, get_all_urls, update_url, increment_url_scans, iter_urls, get_urls_page, format_timestamp, iter_scans, find_url_by_original
+from app.utils.db_migrations import run_migrations, ensure_indexes, convert_string_dates, backfill_scan_classification
+from app.utils.device_utils import classify_user_agent, classifier_stats
+from app.utils.qr_utils import generate_qr_code, add_logo_to_qr, add_frame_and_text, create_qr_for_type, render_qr_image, decode_logo_data
+from app.utils.analytics_utils import log_qr_scan, get_analytics_data, get_scan_timeline, get_analytics_summary
 from app.utils.shortener_utils import create_short_url, get_original_url, get_all_short_urls, update_original_url
 from app.utils.cloudinary import upload_image, get_image_url, delete_image, optimize_image
+from app.utils.render_cache import render_cache, make_render_key, RenderCache
+from app.utils.batch_utils import render_batch, stream_ndjson, stream_zip
+from app.utils.logo_cache import logo_cache, make_logo_key, LogoCache
+from app.utils.font_utils import get_font, measure_text
+from app.utils.frame_templates import frame_templates, FrameTemplateStore
+from app.utils.upload_queue import upload_queue, UploadQueue
+from app.utils.url_cache import redirect_cache, shorten_cache, TTLCache
+from app.utils.url_utils import normalize_url
+from app.utils.click_buffer import click_buffer, ClickCounterBuffer
+from app.utils.scan_queue import scan_queue, ScanIngestQueue
+from app.utils.export_utils import iter_export_scans, stream_scans_ndjson, stream_scans_csv
+from app.utils.shortener_providers import shortener_racer, ShortenerRacer, ShortenerProvider
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.http_client import HTTPClient
+from app.utils.id_allocator import short_id_allocator, BlockIdAllocator, encode_base62, decode_base62
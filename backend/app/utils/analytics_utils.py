@@ -1,27 +1,33 @@
-from app.utils.db_utils import store_scan, get_scans
+from app.utils.db_utils import insert_scan, make_scan_document, get_scans, get_scan_timeline_buckets, count_scans, get_scan_device_counts, get_scan_summary, get_rollup_summary, SCAN_TIMELINE_FORMATS
+from app.utils.device_utils import classify_user_agent, DEVICE_FIELDS
+from app.utils.scan_queue import scan_queue
 from datetime import datetime
 
 def log_qr_scan(qr_id, user_agent=None, ip_address=None):
     """Log QR code scan with user agent and IP address"""
-    return store_scan(qr_id, "", user_agent, ip_address)
+    scan = make_scan_document(qr_id, "", user_agent, ip_address, classify_user_agent(user_agent))
+    
+    # Scans are written in batches in the background; a full queue falls back to a direct insert
+    if scan_queue.submit(scan):
+        return True
+    if not insert_scan(scan, record_rollup=False):
+        return False
+    
+    # The worker records the rollup so a failed counter update is retried like any other
+    scan_queue.add_rollups([scan])
+    return True
 
 def get_analytics_data(qr_id=None):
     """Get analytics data for QR code scans"""
     scans = get_scans(qr_id)
     
-    # Process data to extract device information
     processed_data = []
     for scan in scans:
-        # Extract device info from user agent
-        device = "Unknown"
-        if scan.get('user_agent'):
-            user_agent = str(scan.get('user_agent', '')).lower()
-            if "mobile" in user_agent or "android" in user_agent or "iphone" in user_agent:
-                device = "Mobile"
-            elif "tablet" in user_agent or "ipad" in user_agent:
-                device = "Tablet"
-            else:
-                device = "Desktop"
+        # Scans logged before ingest-time classification are classified here
+        if 'device' in scan:
+            classification = {field: scan.get(field, 'Unknown') for field in DEVICE_FIELDS}
+        else:
+            classification = classify_user_agent(scan.get('user_agent'))
         
         processed_data.append({
             'qr_id': scan.get('qr_id'),
@@ -29,40 +35,75 @@ def get_analytics_data(qr_id=None):
             'timestamp': scan.get('timestamp'),
             'user_agent': scan.get('user_agent'),
             'ip_address': scan.get('ip_address'),
-            'device': device
+            **classification
         })
     
     return processed_data
 
+# Sources the summary endpoints can read from; rollups are daily, raw scans are exact
+ANALYTICS_SOURCES = ('rollup', 'raw')
+
+def can_use_rollups(granularity='day', start=None, end=None):
+    """Check whether the daily rollups can answer a query exactly"""
+    if granularity == 'hour':
+        return False
+    
+    # Ranges that split a day need the raw scans
+    return all(value is None or value == datetime(value.year, value.month, value.day) for value in (start, end))
+
+def get_rollup_or_raw_summary(qr_id=None, granularity='day', start=None, end=None, source='rollup'):
+    """Read a summary from the rollups when they cover the query, otherwise from raw scans"""
+    if granularity not in SCAN_TIMELINE_FORMATS:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if source not in ANALYTICS_SOURCES:
+        raise ValueError(f"Unsupported source: {source}")
+    
+    summary = None
+    if source == 'rollup' and can_use_rollups(granularity, start, end):
+        summary = get_rollup_summary(qr_id, granularity, start, end)
+    
+    if summary is None:
+        summary = get_scan_summary(qr_id, granularity, start, end)
+        source = 'raw'
+    
+    if summary is not None:
+        summary['source'] = source
+    return summary
+
 def get_scan_count(qr_id=None):
     """Get the total number of scans for a QR code or all QR codes"""
-    scans = get_scans(qr_id)
-    return len(scans)
+    return count_scans(qr_id)
 
 def get_unique_devices(qr_id=None):
     """Get the number of unique devices that scanned a QR code"""
-    data = get_analytics_data(qr_id)
-    
-    devices = {}
-    for item in data:
-        device = item.get('device', 'Unknown')
-        devices[device] = devices.get(device, 0) + 1
-    
-    return devices
+    summary = get_rollup_summary(qr_id)
+    return summary['devices'] if summary else get_scan_device_counts(qr_id)
 
-def get_scan_timeline(qr_id=None):
-    """Get timeline data for QR code scans"""
-    data = get_analytics_data(qr_id)
+def format_timeline(buckets, granularity):
+    """Label timeline buckets for the given granularity"""
+    label_format = SCAN_TIMELINE_FORMATS[granularity]
+    return {bucket.strftime(label_format): count for bucket, count in buckets}
+
+def get_scan_timeline(qr_id=None, granularity='day', start=None, end=None, source='rollup'):
+    """Get timeline data for QR code scans, or None when the database query fails"""
+    if granularity not in SCAN_TIMELINE_FORMATS:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if source not in ANALYTICS_SOURCES:
+        raise ValueError(f"Unsupported source: {source}")
     
-    # Group by date
-    timeline = {}
-    for item in data:
-        timestamp = item.get('timestamp', '')
-        date = timestamp.split(' ')[0] if ' ' in timestamp else timestamp
-        
-        timeline[date] = timeline.get(date, 0) + 1
+    if source == 'raw' or not can_use_rollups(granularity, start, end):
+        # Buckets come back from the database already grouped and sorted by date
+        buckets = get_scan_timeline_buckets(qr_id, granularity, start, end)
+        return format_timeline(buckets, granularity) if buckets is not None else None
     
-    # Sort by date
-    sorted_timeline = {k: timeline[k] for k in sorted(timeline.keys())}
+    summary = get_rollup_or_raw_summary(qr_id, granularity, start, end, source)
+    return format_timeline(summary['timeline'], granularity) if summary else None
+
+def get_analytics_summary(qr_id=None, granularity='day', start=None, end=None, source='rollup'):
+    """Get scan count, device breakdown and timeline in a single database round trip"""
+    summary = get_rollup_or_raw_summary(qr_id, granularity, start, end, source)
+    if summary is None:
+        return None
     
-    return sorted_timeline
+    summary['timeline'] = format_timeline(summary['timeline'], granularity)
+    return summary
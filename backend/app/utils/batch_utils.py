@@ -0,0 +1,163 @@
+import os
+import io
+import json
+import base64
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from app.utils.qr_utils import render_qr_image, decode_logo_data
+from app.utils.render_cache import render_cache, make_render_key
+
+# Load environment variables
+load_dotenv()
+
+# Batch rendering settings
+BATCH_WORKERS = int(os.getenv('QR_BATCH_WORKERS', os.cpu_count() or 1))
+BATCH_MAX_ITEMS = int(os.getenv('QR_BATCH_MAX_ITEMS', 100000))
+
+# Process pool shared by all batch requests
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Get the process pool used for batch rendering"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+    return _executor
+
+def merge_options(template, overrides):
+    """Apply per-item options on top of the shared options template"""
+    options = dict(template)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(options.get(key), dict):
+            options[key] = {**options[key], **value}
+        else:
+            options[key] = value
+    return options
+
+def default_qr_id(qr_data):
+    """Build the default QR id used when a request does not supply one"""
+    return base64.urlsafe_b64encode(qr_data.encode()).decode()[:8]
+
+def render_batch(items, template, logo_bytes=None):
+    """Render batch items in the process pool, yielding results as they complete"""
+    executor = get_executor()
+    max_in_flight = BATCH_WORKERS * 4
+    pending = {}
+
+    def finish(future):
+        index, item_id, qr_data, cache_key = pending.pop(future)
+        try:
+            png_bytes = future.result()
+            render_cache.set(cache_key, png_bytes)
+            return {'index': index, 'id': item_id, 'data': qr_data, 'png': png_bytes}
+        except Exception as e:
+            return {'index': index, 'id': item_id, 'data': qr_data, 'error': str(e)}
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            item = {'data': item if isinstance(item, str) else None}
+
+        qr_data = item.get('data')
+        if not qr_data:
+            yield {'index': index, 'id': item.get('id'), 'data': qr_data, 'error': 'No data provided'}
+            continue
+
+        item_id = item.get('id') or default_qr_id(qr_data)
+        overrides = item.get('options') or {}
+        if not isinstance(overrides, dict) or not isinstance(overrides.get('logo') or {}, dict):
+            # The response is already streaming, so bad items are reported rather than raised
+            yield {'index': index, 'id': item_id, 'data': qr_data, 'error': 'Invalid options'}
+            continue
+
+        options = merge_options(template, overrides)
+
+        # Items with their own logo data override the shared template logo
+        item_logo_bytes = logo_bytes
+        if (overrides.get('logo') or {}).get('data'):
+            try:
+                item_logo_bytes = decode_logo_data(overrides)
+                if not item_logo_bytes:
+                    raise ValueError('empty image')
+            except Exception as e:
+                yield {'index': index, 'id': item_id, 'data': qr_data, 'error': f'Invalid logo data: {str(e)}'}
+                continue
+
+        # Cached renders never reach the pool
+        cache_key = make_render_key(qr_data, options, item_logo_bytes)
+        png_bytes = render_cache.get(cache_key)
+        if png_bytes is not None:
+            yield {'index': index, 'id': item_id, 'data': qr_data, 'png': png_bytes}
+            continue
+
+        # Keep a bounded window of work in flight so huge batches stay flat in memory
+        while len(pending) >= max_in_flight:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield finish(future)
+
+        # The logo travels once, already decoded; its base64 form is not pickled to the worker
+        logo_options = options.get('logo')
+        if logo_options and 'data' in logo_options:
+            options['logo'] = {key: value for key, value in logo_options.items() if key != 'data'}
+        future = executor.submit(render_qr_image, qr_data, options, item_logo_bytes)
+        pending[future] = (index, item_id, qr_data, cache_key)
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield finish(future)
+
+def stream_ndjson(results):
+    """Serialize batch results as newline-delimited JSON"""
+    for result in results:
+        png_bytes = result.pop('png', None)
+        if png_bytes is not None:
+            result['image'] = f"data:image/png;base64,{base64.b64encode(png_bytes).decode('utf-8')}"
+        yield json.dumps(result) + '\n'
+
+class _ChunkWriter(io.RawIOBase):
+    """Write-only stream that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_zip(results):
+    """Serialize batch results as a ZIP archive of PNG files"""
+    writer = _ChunkWriter()
+    errors = []
+
+    with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for result in results:
+            if 'png' in result:
+                file_id = str(result['id']).replace('/', '_')
+                archive.writestr(f"{result['index']:06d}_{file_id}.png", result['png'])
+            else:
+                errors.append({key: result[key] for key in ('index', 'id', 'data', 'error')})
+
+            chunk = writer.drain()
+            if chunk:
+                yield chunk
+
+        # Items that failed to render are listed alongside the images
+        if errors:
+            archive.writestr('errors.json', json.dumps(errors, indent=2))
+
+    chunk = writer.drain()
+    if chunk:
+        yield chunk
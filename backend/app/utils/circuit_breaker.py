@@ -0,0 +1,95 @@
+import time
+import threading
+
+# Closed passes every call, open rejects them, half-open lets a few probes through
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that stops calls to a dependency after repeated failures"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_change = time.time()
+
+    def _set_state(self, state):
+        self._state = state
+        self.last_change = time.time()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        self._probes = 0
+
+    def _refresh(self):
+        # An open breaker turns half-open once the reset timeout has passed
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow_request(self):
+        """Check whether a call may go through, reserving a probe slot when half-open"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give back a probe slot for a call that was allowed but never made"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._set_state(OPEN)
+
+    def reset(self):
+        """Force the breaker closed"""
+        with self._lock:
+            self.consecutive_failures = 0
+            self._set_state(CLOSED)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'state': self._state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_in': retry_in,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'last_change': self.last_change
+            }
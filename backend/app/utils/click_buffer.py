@@ -0,0 +1,127 @@
+import os
+import time
+import atexit
+import threading
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from app.utils.db_utils import get_db
+
+# Load environment variables
+load_dotenv()
+
+# Click buffer settings; the flush interval bounds how many seconds of clicks a crash can lose
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', 5))
+CLICK_FLUSH_THRESHOLD = int(os.getenv('CLICK_FLUSH_THRESHOLD', 1000))
+
+class ClickCounterBuffer:
+    """Aggregate short URL clicks in memory and flush them to MongoDB in bulk"""
+
+    def __init__(self, flush_interval=CLICK_FLUSH_INTERVAL, flush_threshold=CLICK_FLUSH_THRESHOLD, collection=None):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.collection = collection
+        self._counts = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.clicks = 0
+        self.flushes = 0
+        self.writes = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self._retry_after = 0.0
+
+    def _get_collection(self):
+        if self.collection is not None:
+            return self.collection
+        return get_db().short_urls
+
+    def _ensure_flusher(self):
+        # The interval flusher is started on the first click
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="click-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def record(self, short_id, count=1):
+        """Count a click; flushes inline once the threshold is reached"""
+        self._ensure_flusher()
+        with self._lock:
+            self._counts[short_id] = self._counts.get(short_id, 0) + count
+            self._pending += count
+            self.clicks += count
+            # After a failed flush, leave retries to the interval flusher
+            should_flush = self._pending >= self.flush_threshold and time.monotonic() >= self._retry_after
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered increments with a single bulk_write"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._counts:
+                    return 0
+                counts = self._counts
+                self._counts = {}
+                self._pending = 0
+
+            start = time.perf_counter()
+            try:
+                self._get_collection().bulk_write(
+                    [UpdateOne({'short_id': short_id}, {'$inc': {'scans': count}}) for short_id, count in counts.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                print(f"Error flushing URL clicks: {str(e)}")
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for short_id, count in counts.items():
+                        self._counts[short_id] = self._counts.get(short_id, 0) + count
+                        self._pending += count
+                    self.flush_errors += 1
+                    self._retry_after = time.monotonic() + self.flush_interval
+                return 0
+
+            with self._lock:
+                self.flushes += 1
+                self.writes += len(counts)
+                self.last_flush_seconds = time.perf_counter() - start
+            return len(counts)
+
+    def pending(self, short_id):
+        """Get the clicks for a short ID that have not been flushed yet"""
+        with self._lock:
+            return self._counts.get(short_id, 0)
+
+    def stop(self):
+        """Stop the interval flusher and flush what is left"""
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        """Get buffered clicks and flush counters"""
+        with self._lock:
+            return {
+                'pending_clicks': self._pending,
+                'pending_urls': len(self._counts),
+                'clicks': self.clicks,
+                'flushes': self.flushes,
+                'writes': self.writes,
+                'flush_errors': self.flush_errors,
+                'last_flush_seconds': self.last_flush_seconds,
+                'flush_interval': self.flush_interval,
+                'flush_threshold': self.flush_threshold
+            }
+
+# Process-wide click buffer, flushed on shutdown
+click_buffer = ClickCounterBuffer()
+atexit.register(click_buffer.stop)
@@ -0,0 +1,163 @@
+import sys
+import pymongo
+from pymongo import UpdateOne, UpdateMany
+from app.utils.device_utils import classify_user_agent
+from app.utils.url_utils import normalize_url
+
+# Format used by the string timestamps written before dates were stored natively
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Indexes every deployment needs: (collection, keys, options)
+INDEXES = [
+    ('short_urls', [('short_id', pymongo.ASCENDING)], {'name': 'short_id_unique', 'unique': True}),
+    ('short_urls', [('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)], {'name': 'created_at_id'}),
+    ('short_urls', [('canonical_url', pymongo.HASHED)], {'name': 'canonical_url_hashed'}),
+    ('qr_scans', [('qr_id', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING)], {'name': 'qr_id_timestamp'}),
+    ('qr_scans', [('timestamp', pymongo.DESCENDING)], {'name': 'timestamp'}),
+    ('qr_scan_rollups', [('qr_id', pymongo.ASCENDING), ('day', pymongo.ASCENDING), ('device', pymongo.ASCENDING)],
+     {'name': 'qr_id_day_device_unique', 'unique': True}),
+    ('qr_scan_rollups', [('day', pymongo.ASCENDING)], {'name': 'day'}),
+    # Upload job state only matters while clients poll for it
+    ('upload_jobs', [('created_at', pymongo.ASCENDING)], {'name': 'created_at_ttl', 'expireAfterSeconds': 86400}),
+]
+
+# String date fields converted to BSON dates: (collection, field)
+DATE_FIELDS = [
+    ('qr_scans', 'timestamp'),
+    ('short_urls', 'created_at'),
+]
+
+def ensure_indexes(db, report):
+    """Create missing indexes, recording which ones were created"""
+    for collection_name, keys, options in INDEXES:
+        collection = db[collection_name]
+        name = options['name']
+        label = f"{collection_name}.{name}"
+        try:
+            existing = collection.index_information()
+            if name in existing:
+                report['indexes'][label] = 'exists'
+                continue
+
+            # An equivalent index under another name counts as present
+            if any(info.get('key') == keys and info.get('unique', False) == options.get('unique', False)
+                   for info in existing.values()):
+                report['indexes'][label] = 'exists'
+                continue
+
+            collection.create_index(keys, **options)
+            report['indexes'][label] = 'created'
+        except Exception as e:
+            report['indexes'][label] = 'failed'
+            report['errors'].append(f"{label}: {str(e)}")
+
+def convert_string_dates(db, report):
+    """Convert legacy string timestamps to BSON dates in place on the server"""
+    for collection_name, field in DATE_FIELDS:
+        label = f"{collection_name}.{field}"
+        try:
+            result = db[collection_name].update_many(
+                {field: {'$type': 'string'}},
+                [{'$set': {field: {'$dateFromString': {
+                    'dateString': f"${field}",
+                    'format': LEGACY_TIMESTAMP_FORMAT,
+                    # Leave values that do not parse untouched
+                    'onError': f"${field}"
+                }}}}]
+            )
+            report['converted'][label] = result.modified_count
+        except Exception as e:
+            report['converted'][label] = 0
+            report['errors'].append(f"{label}: {str(e)}")
+
+def backfill_canonical_urls(db, report, batch_size=1000):
+    """Store the canonical form of original_url on short URLs created before it was recorded"""
+    label = 'short_urls.canonical_url'
+    try:
+        requests = []
+        updated = 0
+        cursor = db.short_urls.find({'canonical_url': {'$exists': False}}, {'original_url': 1}).batch_size(batch_size)
+        for url in cursor:
+            if not url.get('original_url'):
+                continue
+            requests.append(UpdateOne({'_id': url['_id']}, {'$set': {'canonical_url': normalize_url(url['original_url'])}}))
+            if len(requests) >= batch_size:
+                updated += db.short_urls.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        
+        if requests:
+            updated += db.short_urls.bulk_write(requests, ordered=False).modified_count
+        report['converted'][label] = updated
+    except Exception as e:
+        report['converted'][label] = 0
+        report['errors'].append(f"{label}: {str(e)}")
+
+def backfill_scan_qr_ids(db, report):
+    """Copy the QR id of scans logged by the frontend under 'id' into qr_id, where analytics and rollups read it"""
+    label = 'qr_scans.qr_id'
+    try:
+        result = db.qr_scans.update_many(
+            {'qr_id': {'$exists': False}, 'id': {'$exists': True}},
+            [{'$set': {'qr_id': '$id'}}]
+        )
+        report['converted'][label] = result.modified_count
+    except Exception as e:
+        report['converted'][label] = 0
+        report['errors'].append(f"{label}: {str(e)}")
+
+def run_migrations(db):
+    """Bring indexes and stored types up to date; safe to run on every startup"""
+    report = {'indexes': {}, 'converted': {}, 'errors': []}
+
+    # Convert first so the indexes are built over the final values
+    convert_string_dates(db, report)
+    backfill_scan_qr_ids(db, report)
+    backfill_canonical_urls(db, report)
+    ensure_indexes(db, report)
+
+    return report
+
+def format_report(report):
+    """Summarize a migration report in one line"""
+    created = [name for name, state in report['indexes'].items() if state == 'created']
+    converted = {name: count for name, count in report['converted'].items() if count}
+    summary = f"indexes created: {created or 'none'}, converted: {converted or 'none'}"
+    if report['errors']:
+        summary += f", errors: {report['errors']}"
+    return summary
+
+def backfill_scan_classification(db, batch_size=1000):
+    """Store device, OS and browser on scans logged before ingest-time classification"""
+    query = {'device': {'$exists': False}}
+    cursor = db.qr_scans.find(query, {'user_agent': 1}).batch_size(batch_size)
+    updated = 0
+    
+    def flush(batch):
+        # Scans sharing a classification are updated together, which keeps each batch to a few writes
+        groups = {}
+        for scan_id, classification in batch:
+            groups.setdefault(tuple(classification.items()), []).append(scan_id)
+        requests = [UpdateMany({'_id': {'$in': ids}}, {'$set': dict(key)}) for key, ids in groups.items()]
+        return db.qr_scans.bulk_write(requests, ordered=False).modified_count
+    
+    batch = []
+    for scan in cursor:
+        batch.append((scan['_id'], classify_user_agent(scan.get('user_agent'))))
+        if len(batch) >= batch_size:
+            updated += flush(batch)
+            batch = []
+    
+    if batch:
+        updated += flush(batch)
+    
+    return updated
+
+if __name__ == '__main__':
+    from app.utils.db_utils import get_db, rebuild_scan_rollups
+    if 'backfill-devices' in sys.argv[1:]:
+        print(f"Classified scans: {backfill_scan_classification(get_db())}")
+    elif 'rebuild-rollups' in sys.argv[1:]:
+        # Stop the app first; scans rolled up while $out runs are dropped from the rollups
+        print(f"Rollup documents: {rebuild_scan_rollups()}")
+    else:
+        print(f"Migrations: {format_report(run_migrations(get_db()))}")
@@ -1,7 +1,14 @@
 import os
+import base64
 import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
+from bson import json_util
 from dotenv import load_dotenv
+from app.utils.db_migrations import run_migrations, format_report, LEGACY_TIMESTAMP_FORMAT
+from app.utils.device_utils import DEVICE_RULES, classify_user_agent
+from app.utils.url_utils import normalize_url
 
 # Load environment variables
 load_dotenv()
@@ -10,6 +17,26 @@ load_dotenv()
 MONGODB_URI = os.getenv('MONGODB_URI')
 DB_NAME = os.getenv('DB_NAME', 'qr_database')
 
+# Short URL listing settings
+URL_PAGE_DEFAULT_LIMIT = int(os.getenv('URL_PAGE_DEFAULT_LIMIT', 100))
+URL_PAGE_MAX_LIMIT = int(os.getenv('URL_PAGE_MAX_LIMIT', 1000))
+
+# Bucket sizes supported by the scan timeline, with the label format for each
+SCAN_TIMELINE_FORMATS = {
+    'hour': "%Y-%m-%d %H:00",
+    'day': "%Y-%m-%d",
+    'week': "%Y-%m-%d"
+}
+
+# Scan fields that can be exported
+SCAN_EXPORT_FIELDS = ('qr_id', 'url', 'timestamp', 'user_agent', 'ip_address', 'device', 'os', 'browser')
+
+# Fields returned by short URL listings
+URL_LIST_PROJECTION = {'short_id': 1, 'original_url': 1, 'created_at': 1, 'scans': 1, 'short_url': 1}
+
+# Path of links served by this app's /redirect route rather than an external shortener
+LOCAL_REDIRECT_PATH = '/api/url/redirect/'
+
 # MongoDB client
 client = None
 db = None
@@ -28,6 +55,17 @@ def init_db_connection():
         if 'short_urls' not in db.list_collection_names():
             db.create_collection('short_urls')
         
+        # Create indexes and convert legacy data; idempotent
+        report = run_migrations(db)
+        print(f"Migrations: {format_report(report)}")
+        
+        # Seed the analytics rollups the first time they are needed; later rebuilds need ingestion paused
+        try:
+            if db.qr_scan_rollups.estimated_document_count() == 0 and db.qr_scans.find_one({}, {'_id': 1}):
+                print(f"Built scan rollups: {rebuild_scan_rollups()}")
+        except Exception as e:
+            print(f"Error building scan rollups: {str(e)}")
+        
         print(f"Connected to MongoDB: {DB_NAME}")
         return True
     except Exception as e:
@@ -41,26 +79,82 @@ def get_db():
         init_db_connection()
     return db
 
+def format_timestamp(value):
+    """Format a stored date the way the API has always returned it"""
+    if isinstance(value, datetime):
+        return value.strftime(LEGACY_TIMESTAMP_FORMAT)
+    return value
+
 # Analytics functions
-def store_scan(qr_id, url="", user_agent=None, ip_address=None):
+def make_scan_document(qr_id, url="", user_agent=None, ip_address=None, classification=None):
+    """Build the document stored for one QR code scan"""
+    scan = {
+        'qr_id': qr_id,
+        'url': url,
+        'timestamp': datetime.now(),
+        'user_agent': user_agent,
+        'ip_address': ip_address
+    }
+    
+    # Device, OS and browser fields classified at ingest
+    if classification:
+        scan.update(classification)
+    
+    return scan
+
+def store_scan(qr_id, url="", user_agent=None, ip_address=None, classification=None):
     """Store QR code scan in database"""
+    return insert_scan(make_scan_document(qr_id, url, user_agent, ip_address, classification))
+
+def insert_scan(scan, record_rollup=True):
+    """Write one scan document and, unless the caller records it separately, its rollup"""
     try:
         db = get_db()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        db.qr_scans.insert_one({
-            'qr_id': qr_id,
-            'url': url,
-            'timestamp': timestamp,
-            'user_agent': user_agent,
-            'ip_address': ip_address
-        })
+        
+        db.qr_scans.insert_one(scan)
+        
+        if record_rollup:
+            record_scan_rollups([scan])
         
         return True
     except Exception as e:
         print(f"Error storing scan: {str(e)}")
         return False
 
+def record_scan_rollups(scans):
+    """Add stored scans to their per-(qr_id, day, device) rollup counters in one bulk write
+
+    Returns the scans whose counters were not updated, so the caller can retry just those.
+    """
+    counters = {}
+    for scan in scans:
+        timestamp = scan['timestamp']
+        device = scan['device'] if 'device' in scan else classify_user_agent(scan.get('user_agent'))['device']
+        key = (scan['qr_id'], datetime(timestamp.year, timestamp.month, timestamp.day), device)
+        counters.setdefault(key, []).append(scan)
+    
+    groups = list(counters.items())
+    if not groups:
+        return []
+    
+    try:
+        db = get_db()
+        
+        db.qr_scan_rollups.bulk_write([
+            UpdateOne({'qr_id': qr_id, 'day': day, 'device': device}, {'$inc': {'count': len(members)}}, upsert=True)
+            for (qr_id, day, device), members in groups
+        ], ordered=False)
+        
+        return []
+    except BulkWriteError as e:
+        # Unordered bulk writes still apply the other counters, so only the failed ones are handed back
+        print(f"Error updating scan rollups: {str(e)}")
+        failed = {error['index'] for error in e.details.get('writeErrors', [])}
+        return [scan for index, (_, members) in enumerate(groups) if index in failed for scan in members]
+    except Exception as e:
+        print(f"Error updating scan rollups: {str(e)}")
+        return list(scans)
+
 def get_scans(qr_id=None):
     """Get QR code scans from database"""
     try:
@@ -71,28 +165,264 @@ def get_scans(qr_id=None):
         
         scans = list(db.qr_scans.find(query).sort('timestamp', -1))
         
-        # Convert ObjectId to string for JSON serialization
+        # Convert ObjectId and dates to strings for JSON serialization
         for scan in scans:
             if '_id' in scan:
                 scan['_id'] = str(scan['_id'])
+            scan['timestamp'] = format_timestamp(scan.get('timestamp'))
         
         return scans
     except Exception as e:
         print(f"Error retrieving scans: {str(e)}")
         return []
 
+def scan_range_query(qr_id=None, start=None, end=None):
+    """Build a scan filter for a QR id and [start, end) range that still matches legacy string timestamps"""
+    query = {'qr_id': qr_id} if qr_id else {}
+    if start is None and end is None:
+        return query
+    
+    date_range = {}
+    string_range = {'$type': 'string'}
+    if start is not None:
+        date_range['$gte'] = start
+        string_range['$gte'] = start.strftime(LEGACY_TIMESTAMP_FORMAT)
+    if end is not None:
+        date_range['$lt'] = end
+        string_range['$lt'] = end.strftime(LEGACY_TIMESTAMP_FORMAT)
+    
+    # Comparisons never cross BSON types, and the legacy format sorts lexically by time
+    query['$or'] = [{'timestamp': date_range}, {'timestamp': string_range}]
+    return query
+
+def iter_scans(qr_id=None, start=None, end=None, fields=SCAN_EXPORT_FIELDS, batch_size=1000):
+    """Stream scan documents, newest first, fetching only the requested fields"""
+    db = get_db()
+    projection = {field: 1 for field in fields}
+    projection['_id'] = 0
+    cursor = db.qr_scans.find(scan_range_query(qr_id, start, end), projection).sort(
+        'timestamp', pymongo.DESCENDING
+    ).batch_size(batch_size)
+    
+    for scan in cursor:
+        if 'timestamp' in scan:
+            scan['timestamp'] = format_timestamp(scan['timestamp'])
+        yield scan
+
+def scan_device_expression():
+    """Aggregation expression for a scan's device, classifying unbackfilled scans from their user agent"""
+    user_agent = {'$ifNull': ['$user_agent', '']}
+    branches = [{'case': {'$eq': [user_agent, '']}, 'then': 'Unknown'}]
+    for device, pattern in DEVICE_RULES:
+        branches.append({
+            'case': {'$regexMatch': {'input': {'$toString': user_agent}, 'regex': pattern.pattern, 'options': 'i'}},
+            'then': device
+        })
+    return {'$ifNull': ['$device', {'$switch': {'branches': branches, 'default': 'Desktop'}}]}
+
+def scan_timestamp_expression():
+    """Aggregation expression for a scan's timestamp, parsing legacy strings that have not been migrated yet"""
+    return {'$cond': [
+        {'$eq': [{'$type': '$timestamp'}, 'string']},
+        {'$dateFromString': {
+            'dateString': '$timestamp',
+            'format': LEGACY_TIMESTAMP_FORMAT,
+            'onError': None
+        }},
+        '$timestamp'
+    ]}
+
+def scan_timeline_stages(unit='day'):
+    """Aggregation stages that count matched scans per hour, day or week"""
+    date_trunc = {'date': '$timestamp', 'unit': unit}
+    if unit == 'week':
+        date_trunc['startOfWeek'] = 'monday'
+    
+    return [
+        {'$project': {'timestamp': scan_timestamp_expression()}},
+        {'$match': {'timestamp': {'$type': 'date'}}},
+        {'$group': {
+            '_id': {'$dateTrunc': date_trunc},
+            'count': {'$sum': 1}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+
+def get_scan_timeline_buckets(qr_id=None, unit='day', start=None, end=None):
+    """Count scans per hour, day or week with a server-side aggregation"""
+    try:
+        db = get_db()
+        
+        pipeline = [{'$match': scan_range_query(qr_id, start, end)}] + scan_timeline_stages(unit)
+        
+        return [(bucket['_id'], bucket['count']) for bucket in db.qr_scans.aggregate(pipeline)]
+    except Exception as e:
+        print(f"Error aggregating scan timeline: {str(e)}")
+        return None
+
+def count_scans(qr_id=None, start=None, end=None):
+    """Count scans on the server without loading them"""
+    try:
+        db = get_db()
+        
+        pipeline = [{'$match': scan_range_query(qr_id, start, end)}, {'$count': 'total'}]
+        
+        result = list(db.qr_scans.aggregate(pipeline))
+        return result[0]['total'] if result else 0
+    except Exception as e:
+        print(f"Error counting scans: {str(e)}")
+        return 0
+
+def get_scan_device_counts(qr_id=None, start=None, end=None):
+    """Count scans per device type with a server-side aggregation"""
+    try:
+        db = get_db()
+        
+        pipeline = [
+            {'$match': scan_range_query(qr_id, start, end)},
+            {'$group': {'_id': scan_device_expression(), 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ]
+        
+        return {bucket['_id']: bucket['count'] for bucket in db.qr_scans.aggregate(pipeline)}
+    except Exception as e:
+        print(f"Error aggregating scan devices: {str(e)}")
+        return {}
+
+def get_scan_summary(qr_id=None, unit='day', start=None, end=None):
+    """Get scan totals, device breakdown, timeline and latest scan in one aggregation"""
+    try:
+        db = get_db()
+        
+        pipeline = [
+            {'$match': scan_range_query(qr_id, start, end)},
+            {'$facet': {
+                'total': [{'$count': 'total'}],
+                'unique_qrs': [{'$group': {'_id': '$qr_id'}}, {'$count': 'total'}],
+                'devices': [
+                    {'$group': {'_id': scan_device_expression(), 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ],
+                'timeline': scan_timeline_stages(unit),
+                'latest': [
+                    {'$sort': {'timestamp': -1}},
+                    {'$limit': 1},
+                    {'$project': {'_id': 0, 'timestamp': 1}}
+                ]
+            }}
+        ]
+        
+        facets = next(db.qr_scans.aggregate(pipeline))
+        total = facets['total'][0]['total'] if facets['total'] else 0
+        unique_qrs = facets['unique_qrs'][0]['total'] if facets['unique_qrs'] else 0
+        latest = facets['latest'][0]['timestamp'] if facets['latest'] else None
+        
+        return {
+            'total_scans': total,
+            'unique_qrs': unique_qrs,
+            'latest_scan': format_timestamp(latest),
+            'devices': {bucket['_id']: bucket['count'] for bucket in facets['devices']},
+            'timeline': [(bucket['_id'], bucket['count']) for bucket in facets['timeline']]
+        }
+    except Exception as e:
+        print(f"Error aggregating scan summary: {str(e)}")
+        return None
+
+def rollup_range_query(qr_id=None, start=None, end=None):
+    """Build a rollup filter for a QR id and [start, end) range of days"""
+    query = {'qr_id': qr_id} if qr_id else {}
+    day_range = {}
+    if start is not None:
+        day_range['$gte'] = start
+    if end is not None:
+        day_range['$lt'] = end
+    if day_range:
+        query['day'] = day_range
+    return query
+
+def get_rollup_summary(qr_id=None, unit='day', start=None, end=None):
+    """Get scan totals, device breakdown and timeline from the daily rollups"""
+    try:
+        db = get_db()
+        
+        date_trunc = {'date': '$day', 'unit': unit}
+        if unit == 'week':
+            date_trunc['startOfWeek'] = 'monday'
+        
+        pipeline = [
+            {'$match': rollup_range_query(qr_id, start, end)},
+            {'$facet': {
+                'total': [{'$group': {'_id': None, 'total': {'$sum': '$count'}}}],
+                'unique_qrs': [{'$group': {'_id': '$qr_id'}}, {'$count': 'total'}],
+                'devices': [
+                    {'$group': {'_id': '$device', 'count': {'$sum': '$count'}}},
+                    {'$sort': {'count': -1}}
+                ],
+                'timeline': [
+                    {'$group': {'_id': {'$dateTrunc': date_trunc}, 'count': {'$sum': '$count'}}},
+                    {'$sort': {'_id': 1}}
+                ]
+            }}
+        ]
+        
+        facets = next(db.qr_scan_rollups.aggregate(pipeline))
+        total = facets['total'][0]['total'] if facets['total'] else 0
+        unique_qrs = facets['unique_qrs'][0]['total'] if facets['unique_qrs'] else 0
+        
+        # Rollups have no per-scan times, so the latest scan comes from the timestamp index
+        latest = db.qr_scans.find_one(scan_range_query(qr_id, start, end), {'timestamp': 1}, sort=[('timestamp', -1)])
+        
+        return {
+            'total_scans': total,
+            'unique_qrs': unique_qrs,
+            'latest_scan': format_timestamp(latest.get('timestamp')) if latest else None,
+            'devices': {bucket['_id']: bucket['count'] for bucket in facets['devices']},
+            'timeline': [(bucket['_id'], bucket['count']) for bucket in facets['timeline']]
+        }
+    except Exception as e:
+        print(f"Error reading scan rollups: {str(e)}")
+        return None
+
+def rebuild_scan_rollups():
+    """Recompute every rollup from the raw scans, replacing the rollup collection
+
+    Run with scan ingestion paused: $out replaces the collection with a snapshot
+    of the scans, so increments upserted while it runs are lost.
+    """
+    db = get_db()
+    
+    pipeline = [
+        {'$project': {'qr_id': 1, 'timestamp': scan_timestamp_expression(), 'device': scan_device_expression()}},
+        {'$match': {'timestamp': {'$type': 'date'}}},
+        {'$group': {
+            '_id': {
+                'qr_id': '$qr_id',
+                'day': {'$dateTrunc': {'date': '$timestamp', 'unit': 'day'}},
+                'device': '$device'
+            },
+            'count': {'$sum': 1}
+        }},
+        {'$project': {'_id': 0, 'qr_id': '$_id.qr_id', 'day': '$_id.day', 'device': '$_id.device', 'count': 1}},
+        # $out swaps the collection in atomically and keeps its indexes
+        {'$out': 'qr_scan_rollups'}
+    ]
+    
+    db.qr_scans.aggregate(pipeline, allowDiskUse=True)
+    return db.qr_scan_rollups.estimated_document_count()
+
 # URL Shortener functions
 def store_url(short_id, original_url, short_url=None):
     """Store URL in database"""
     try:
         db = get_db()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = datetime.now()
         
         db.short_urls.update_one(
             {'short_id': short_id},
             {'$set': {
                 'short_id': short_id,
                 'original_url': original_url,
+                'canonical_url': normalize_url(original_url),
                 'created_at': timestamp,
                 'scans': 0,
                 'short_url': short_url
@@ -105,7 +435,7 @@ def store_url(short_id, original_url, short_url=None):
         print(f"Error storing URL: {str(e)}")
         return False
 
-def get_url(short_id):
+def get_url(short_id, count_scan=True):
     """Get URL from database"""
     try:
         db = get_db()
@@ -113,14 +443,13 @@ def get_url(short_id):
         
         if result:
             # Increment scan count
-            db.short_urls.update_one(
-                {'short_id': short_id},
-                {'$inc': {'scans': 1}}
-            )
+            if count_scan:
+                increment_url_scans(short_id)
             
-            # Convert ObjectId to string for JSON serialization
+            # Convert ObjectId and dates to strings for JSON serialization
             if '_id' in result:
                 result['_id'] = str(result['_id'])
+            result['created_at'] = format_timestamp(result.get('created_at'))
             
             return result
         
@@ -129,29 +458,123 @@ def get_url(short_id):
         print(f"Error retrieving URL: {str(e)}")
         return None
 
+def increment_url_scans(short_id, count=1):
+    """Increment the scan count of a short URL"""
+    try:
+        db = get_db()
+        db.short_urls.update_one(
+            {'short_id': short_id},
+            {'$inc': {'scans': count}}
+        )
+        
+        return True
+    except Exception as e:
+        print(f"Error incrementing URL scans: {str(e)}")
+        return False
+
 def get_all_urls():
     """Get all URLs from database"""
     try:
         db = get_db()
         urls = list(db.short_urls.find().sort('created_at', -1))
         
-        # Convert ObjectId to string for JSON serialization
+        # Convert ObjectId and dates to strings for JSON serialization
         for url in urls:
             if '_id' in url:
                 url['_id'] = str(url['_id'])
+            url['created_at'] = format_timestamp(url.get('created_at'))
         
         return urls
     except Exception as e:
         print(f"Error retrieving URLs: {str(e)}")
         return []
 
+def iter_urls(batch_size=500):
+    """Stream short URL documents, newest first, without loading them all"""
+    db = get_db()
+    cursor = db.short_urls.find({}, URL_LIST_PROJECTION).sort(
+        [('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+    ).batch_size(batch_size)
+    
+    for url in cursor:
+        url['_id'] = str(url['_id'])
+        url['created_at'] = format_timestamp(url.get('created_at'))
+        yield url
+
+def encode_url_cursor(url):
+    """Encode the keyset position after a short URL document"""
+    position = json_util.dumps({'created_at': url.get('created_at'), '_id': url['_id']})
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_url_cursor(cursor):
+    """Decode a keyset position produced by encode_url_cursor"""
+    position = json_util.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return position['created_at'], position['_id']
+
+def get_urls_page(limit=URL_PAGE_DEFAULT_LIMIT, cursor=None):
+    """Get one page of short URLs, newest first, and the cursor for the next page"""
+    try:
+        db = get_db()
+        limit = max(1, min(int(limit), URL_PAGE_MAX_LIMIT))
+        
+        # Keyset pagination: everything strictly after the last (created_at, _id) seen
+        query = {}
+        if cursor:
+            created_at, last_id = decode_url_cursor(cursor)
+            query = {'$or': [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': last_id}}
+            ]}
+        
+        # Fetch one extra document to know whether another page exists
+        urls = list(db.short_urls.find(query, URL_LIST_PROJECTION).sort(
+            [('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+        ).limit(limit + 1))
+        
+        next_cursor = None
+        if len(urls) > limit:
+            urls = urls[:limit]
+            next_cursor = encode_url_cursor(urls[-1])
+        
+        # Convert ObjectId and dates to strings for JSON serialization
+        for url in urls:
+            url['_id'] = str(url['_id'])
+            url['created_at'] = format_timestamp(url.get('created_at'))
+        
+        return urls, next_cursor
+    except Exception as e:
+        print(f"Error retrieving URL page: {str(e)}")
+        return [], None
+
+def find_url_by_original(original_url):
+    """Get the newest short URL stored for the canonical form of an original URL"""
+    try:
+        db = get_db()
+        
+        # Equality on canonical_url is served by its hashed index
+        return db.short_urls.find_one(
+            {'canonical_url': normalize_url(original_url), 'short_url': {'$ne': None}},
+            URL_LIST_PROJECTION,
+            sort=[('created_at', pymongo.DESCENDING)]
+        )
+    except Exception as e:
+        print(f"Error looking up URL: {str(e)}")
+        return None
+
 def update_url(short_id, new_url):
     """Update URL in database"""
     try:
         db = get_db()
+        
+        # External short links keep redirecting to the old destination, so only local links
+        # answer for the new one; null rather than $unset so the canonical_url backfill skips them
+        current = db.short_urls.find_one({'short_id': short_id}, {'short_url': 1}) or {}
+        is_local = LOCAL_REDIRECT_PATH in (current.get('short_url') or '')
+        canonical_url = normalize_url(new_url) if is_local else None
+        
         result = db.short_urls.update_one(
             {'short_id': short_id},
-            {'$set': {'original_url': new_url}}
+            {'$set': {'original_url': new_url, 'canonical_url': canonical_url}}
         )
         
         return result.modified_count > 0
@@ -0,0 +1,73 @@
+import os
+import re
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of distinct user agent strings whose classification is kept in memory
+UA_CACHE_SIZE = int(os.getenv('UA_CACHE_SIZE', 10000))
+
+# Classification fields stored on each scan document
+DEVICE_FIELDS = ('device', 'os', 'browser')
+
+# Rules are checked in order and the first match wins
+DEVICE_RULES = [
+    ('Mobile', re.compile(r'mobile|android|iphone', re.IGNORECASE)),
+    ('Tablet', re.compile(r'tablet|ipad', re.IGNORECASE))
+]
+
+OS_RULES = [
+    ('iOS', re.compile(r'iphone|ipad|ipod', re.IGNORECASE)),
+    ('Android', re.compile(r'android', re.IGNORECASE)),
+    ('Windows', re.compile(r'windows', re.IGNORECASE)),
+    ('ChromeOS', re.compile(r'\bcros\b', re.IGNORECASE)),
+    ('macOS', re.compile(r'macintosh|mac os x', re.IGNORECASE)),
+    ('Linux', re.compile(r'linux|x11', re.IGNORECASE))
+]
+
+# Most browsers also claim to be Chrome and Safari, so the specific ones come first
+BROWSER_RULES = [
+    ('Bot', re.compile(r'bot\b|crawler|spider|curl|wget', re.IGNORECASE)),
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.IGNORECASE)),
+    ('Opera', re.compile(r'opr/|opera', re.IGNORECASE)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.IGNORECASE)),
+    ('Chrome', re.compile(r'chrome/|crios/', re.IGNORECASE)),
+    ('Firefox', re.compile(r'firefox/|fxios/', re.IGNORECASE)),
+    ('Safari', re.compile(r'safari/', re.IGNORECASE))
+]
+
+def match_rules(rules, user_agent, default):
+    """Return the label of the first rule matching the user agent"""
+    for label, pattern in rules:
+        if pattern.search(user_agent):
+            return label
+    return default
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def _classify(user_agent):
+    if not user_agent:
+        return ('Unknown', 'Unknown', 'Unknown')
+
+    return (
+        match_rules(DEVICE_RULES, user_agent, 'Desktop'),
+        match_rules(OS_RULES, user_agent, 'Other'),
+        match_rules(BROWSER_RULES, user_agent, 'Other')
+    )
+
+def classify_user_agent(user_agent):
+    """Classify a user agent string into device, OS and browser"""
+    return dict(zip(DEVICE_FIELDS, _classify(str(user_agent) if user_agent else None)))
+
+def classifier_stats():
+    """Get hit/miss counters for the classification cache"""
+    info = _classify.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_ratio': info.hits / lookups if lookups else 0.0,
+        'entries': info.currsize,
+        'max_entries': info.maxsize
+    }
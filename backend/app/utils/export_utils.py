@@ -0,0 +1,76 @@
+import io
+import os
+import csv
+import json
+from dotenv import load_dotenv
+from app.utils.db_utils import iter_scans, SCAN_EXPORT_FIELDS
+from app.utils.device_utils import classify_user_agent, DEVICE_FIELDS
+
+# Load environment variables
+load_dotenv()
+
+# Export settings; chunks are sent once they reach this many characters
+EXPORT_BATCH_SIZE = int(os.getenv('SCAN_EXPORT_BATCH_SIZE', 1000))
+EXPORT_CHUNK_SIZE = int(os.getenv('SCAN_EXPORT_CHUNK_SIZE', 64 * 1024))
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+def parse_export_fields(value):
+    """Parse a comma separated field list, defaulting to every exportable field"""
+    if not value:
+        return SCAN_EXPORT_FIELDS
+
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in SCAN_EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def iter_export_scans(qr_id=None, start=None, end=None, fields=SCAN_EXPORT_FIELDS):
+    """Stream scans with the requested fields, classifying scans logged before ingest-time classification"""
+    wants_device = any(field in DEVICE_FIELDS for field in fields)
+    query_fields = fields
+    if wants_device and 'user_agent' not in fields:
+        query_fields = fields + ('user_agent',)
+
+    for scan in iter_scans(qr_id, start, end, query_fields, EXPORT_BATCH_SIZE):
+        if wants_device and 'device' not in scan:
+            scan.update(classify_user_agent(scan.get('user_agent')))
+        yield {field: scan.get(field) for field in fields}
+
+def chunked(lines):
+    """Join small strings into chunks of roughly EXPORT_CHUNK_SIZE characters"""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_scans_ndjson(scans):
+    """Serialize scans as newline-delimited JSON chunks"""
+    return chunked(json.dumps(scan, default=str) + '\n' for scan in scans)
+
+def stream_scans_csv(scans, fields):
+    """Serialize scans as CSV chunks with a header row"""
+    def lines():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(fields)
+        for scan in scans:
+            writer.writerow(['' if scan[field] is None else scan[field] for field in fields])
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+        yield output.getvalue()
+
+    return chunked(lines())
@@ -0,0 +1,51 @@
+import threading
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+# Process-wide font registry keyed by (family, size)
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+# Scratch canvas used only for text measurement
+_measure_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+def load_default_font(font_size=None):
+    """Load Pillow's default font, sized when the installed Pillow supports it"""
+    if font_size is None:
+        return ImageFont.load_default()
+    
+    try:
+        return ImageFont.load_default(font_size)
+    except TypeError:
+        # Pillow < 10.1 only ships the fixed-size bitmap font
+        return ImageFont.load_default()
+
+def get_font(font_family=None, font_size=None):
+    """Get a font from the registry, loading each (family, size) only once"""
+    key = (font_family, font_size)
+    font = _fonts.get(key)
+    if font is not None:
+        return font
+    
+    with _fonts_lock:
+        font = _fonts.get(key)
+        if font is None:
+            if font_family:
+                try:
+                    font = ImageFont.truetype(font_family, font_size or 20)
+                except IOError:
+                    # Fall back to the default font if the family is not available
+                    pass
+            
+            if font is None:
+                font = load_default_font(font_size)
+            
+            _fonts[key] = font
+    
+    return font
+
+@lru_cache(maxsize=4096)
+def measure_text(text, font):
+    """Get the (width, height) of text rendered in a registry font"""
+    left, top, right, bottom = _measure_draw.textbbox((0, 0), text, font=font)
+    return right - left, bottom - top
@@ -0,0 +1,126 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageOps
+from dotenv import load_dotenv
+from app.utils.logo_cache import image_nbytes
+
+# Load environment variables
+load_dotenv()
+
+# Frame template settings; a large framed QR code can need over 100 MB per template
+FRAME_TEMPLATE_MAX_BYTES = int(os.getenv('QR_FRAME_TEMPLATE_MAX_BYTES', 64 * 1024 * 1024))
+
+class FrameTemplate:
+    """Precomputed frame background and masks for one frame geometry"""
+
+    def __init__(self, background, mask=None, outside_mask=None):
+        self.background = background
+        self.mask = mask
+        self.outside_mask = outside_mask
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the background and masks"""
+        return sum(image_nbytes(img) for img in (self.background, self.mask, self.outside_mask) if img is not None)
+
+def build_frame_mask(width, height, frame_style, frame_width):
+    """Draw the alpha mask for rounded and circle frames"""
+    if frame_style not in ('rounded', 'circle'):
+        return None
+    
+    mask = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    if frame_style == 'rounded':
+        # Rounded corners use the frame width as radius
+        draw.rounded_rectangle([(0, 0), (width, height)], frame_width, fill=255)
+    else:
+        draw.ellipse((0, 0, width, height), fill=255)
+    
+    return mask
+
+class FrameTemplateStore:
+    """Memory-bounded LRU store of frame templates keyed by their geometry and colour"""
+
+    def __init__(self, max_bytes=FRAME_TEMPLATE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._templates = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, width, height, frame_style, frame_color, frame_width, palette_index=None):
+        """Get the template for a frame, building it on first use
+
+        Palette templates are filled with palette_index and leave the palette
+        to the caller, so they are shared across frame colours.
+        """
+        color_key = ('P', palette_index) if palette_index is not None else frame_color
+        key = (width, height, frame_style, color_key, frame_width)
+        
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+        
+        template = self._build(width, height, frame_style, frame_color, frame_width, palette_index)
+        
+        # Templates larger than the whole budget are used once and never kept
+        nbytes = template.nbytes
+        if nbytes > self.max_bytes:
+            return template
+        
+        with self._lock:
+            old_template = self._templates.pop(key, None)
+            if old_template is not None:
+                self._size -= old_template.nbytes
+            
+            self._templates[key] = template
+            self._size += nbytes
+            
+            while self._size > self.max_bytes:
+                _, evicted = self._templates.popitem(last=False)
+                self._size -= evicted.nbytes
+                self.evictions += 1
+        
+        return template
+
+    def _build(self, width, height, frame_style, frame_color, frame_width, palette_index):
+        mask = build_frame_mask(width, height, frame_style, frame_width)
+        
+        if palette_index is not None:
+            background = Image.new('P', (width, height), palette_index)
+            outside_mask = ImageOps.invert(mask) if mask is not None else None
+            return FrameTemplate(background, mask, outside_mask)
+        
+        background = Image.new('RGB', (width, height), frame_color)
+        return FrameTemplate(background, mask)
+
+    def clear(self):
+        """Drop all templates and reset counters"""
+        with self._lock:
+            self._templates.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._templates),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
+
+# Process-wide frame template store
+frame_templates = FrameTemplateStore()
@@ -0,0 +1,91 @@
+import os
+import string
+import threading
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+from app.utils.db_utils import get_db
+
+# Load environment variables
+load_dotenv()
+
+# Short ID allocator settings; a restart abandons the rest of the current block
+SHORT_ID_BLOCK_SIZE = int(os.getenv('SHORT_ID_BLOCK_SIZE', 1000))
+SHORT_ID_COUNTER = os.getenv('SHORT_ID_COUNTER', 'short_urls')
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+def encode_base62(number):
+    """Encode a non-negative integer with digits and ASCII letters"""
+    if number == 0:
+        return BASE62_ALPHABET[0]
+
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+def decode_base62(value):
+    """Decode a base62 string back to its integer"""
+    number = 0
+    for char in value:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+class BlockIdAllocator:
+    """Hand out unique base62 short IDs from blocks reserved on a MongoDB counter document"""
+
+    def __init__(self, counter_name=SHORT_ID_COUNTER, block_size=SHORT_ID_BLOCK_SIZE, collection=None):
+        self.counter_name = counter_name
+        self.block_size = block_size
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self.issued = 0
+        self.blocks = 0
+
+    def _get_collection(self):
+        if self.collection is not None:
+            return self.collection
+        return get_db().counters
+
+    def _reserve_block(self):
+        # One atomic $inc reserves block_size numbers for this process alone
+        counter = self._get_collection().find_one_and_update(
+            {'_id': self.counter_name},
+            {'$inc': {'value': self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter['value']
+        self._next = self._end - self.block_size
+        self.blocks += 1
+
+    def next_number(self):
+        """Get the next unused number, reserving a new block when the current one runs out"""
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            number = self._next
+            self._next += 1
+            self.issued += 1
+            return number
+
+    def next_id(self):
+        """Get the next unused base62 short ID"""
+        return encode_base62(self.next_number())
+
+    def stats(self):
+        """Get issued IDs, reserved blocks and what is left of the current block"""
+        with self._lock:
+            return {
+                'issued': self.issued,
+                'blocks': self.blocks,
+                'block_size': self.block_size,
+                'remaining_in_block': self._end - self._next,
+                'next_id': encode_base62(self._next) if self._next < self._end else None
+            }
+
+# Process-wide short ID allocator
+short_id_allocator = BlockIdAllocator()
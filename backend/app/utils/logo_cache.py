@@ -0,0 +1,87 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Logo cache settings
+LOGO_CACHE_MAX_BYTES = int(os.getenv('QR_LOGO_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+def make_logo_key(logo_bytes, logo_size, shape, border, border_color, opacity):
+    """Build the cache key for a prepared logo tile"""
+    digest = hashlib.sha256(logo_bytes).hexdigest()
+    return (digest, logo_size, shape, bool(border), str(border_color), float(opacity))
+
+def image_nbytes(img):
+    """Approximate the memory held by a PIL image"""
+    return img.width * img.height * len(img.getbands())
+
+class LogoCache:
+    """Memory-bounded LRU cache of prepared RGBA logo tiles"""
+
+    def __init__(self, max_bytes=LOGO_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the prepared tile for a key, or None on a miss"""
+        with self._lock:
+            tile = self._entries.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def set(self, key, tile):
+        """Store a prepared tile, evicting least recently used tiles"""
+        nbytes = image_nbytes(tile)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old_tile = self._entries.pop(key, None)
+            if old_tile is not None:
+                self._size -= image_nbytes(old_tile)
+
+            self._entries[key] = tile
+            self._size += nbytes
+
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= image_nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all tiles and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
+
+# Process-wide logo cache
+logo_cache = LogoCache()
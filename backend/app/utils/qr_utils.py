@@ -1,14 +1,36 @@
 import qrcode
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageOps
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageEnhance, ImageOps, ImageColor
 import io
 import base64
 import json
 import uuid
 import os
 from datetime import datetime
+from xml.sax.saxutils import escape
+from app.utils.logo_cache import logo_cache, make_logo_key
+from app.utils.font_utils import get_font, measure_text
+from app.utils.frame_templates import frame_templates
 
-def generate_qr_code(data, error_correction='M', version=None, box_size=10, border=4):
-    """Generate QR code with specified error correction and parameters"""
+# Palette layout used by the palette ("P") pipeline
+PALETTE_FILL = 0
+PALETTE_BACK = 1
+PALETTE_FRAME = 2
+PALETTE_TEXT = 3
+PALETTE_TRANSPARENT = 4
+
+# Extra entities escaped inside SVG attribute values
+SVG_ATTR_ENTITIES = {'"': '&quot;'}
+
+# Mimetypes for the image formats the pipeline can produce
+IMAGE_MIMETYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml'
+}
+
+def build_qr(data, error_correction='M', version=None, box_size=10, border=4):
+    """Build a QRCode object with its module matrix computed"""
     # Map error correction level string to qrcode constants
     error_levels = {
         'L': qrcode.constants.ERROR_CORRECT_L,
@@ -29,21 +51,87 @@ def generate_qr_code(data, error_correction='M', version=None, box_size=10, bord
     qr.add_data(data)
     qr.make(fit=True)
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    return qr
+
+def generate_qr_code(data, error_correction='M', version=None, box_size=10, border=4, renderer='pil',
+                     palette=False, fill_color='black', back_color='white'):
+    """Generate QR code with specified error correction and parameters"""
+    qr = build_qr(data, error_correction, version, box_size, border)
+    
+    # Palette mode and the NumPy engine rasterize straight from the module matrix
+    if palette or renderer == 'numpy':
+        return render_qr_matrix(qr, fill_color, back_color, palette=palette)
+    
+    img = qr.make_image(fill_color=fill_color, back_color=back_color)
     # Ensure the image is in PIL Image format
     if not isinstance(img, Image.Image):
         img = img.convert('RGB')
     
     return img
 
-def add_logo_to_qr(qr_img, logo_img, size_ratio=0.2, position='center', shape='square', border=True, border_color='white', opacity=1.0):
+def render_qr_matrix(qr, fill_color='black', back_color='white', palette=False):
+    """Rasterize a built QRCode from its module matrix with NumPy upscaling"""
+    # get_matrix() already includes the quiet zone border modules
+    modules = np.asarray(qr.get_matrix(), dtype=bool)
+    
+    # Dark modules use the fill palette entry and light modules the background
+    indices = np.where(modules, np.uint8(PALETTE_FILL), np.uint8(PALETTE_BACK))
+    
+    # Scale every module up to a box_size x box_size block
+    indices = indices.repeat(qr.box_size, axis=0).repeat(qr.box_size, axis=1)
+    
+    img = Image.frombytes('P', (indices.shape[1], indices.shape[0]), indices.tobytes())
+    img.putpalette(list(ImageColor.getcolor(fill_color, 'RGB')) + list(ImageColor.getcolor(back_color, 'RGB')))
+    
+    if palette:
+        return img
+    
+    # Same output as the PIL factory path for the RGB pipeline
+    return img.convert('RGB')
+
+def to_qr_palette(qr_img):
+    """Convert a 1-bit QR image to the palette layout used by the palette pipeline"""
+    if qr_img.mode == 'P':
+        return qr_img
+    
+    img = qr_img.convert('L').point(lambda v: PALETTE_BACK if v else PALETTE_FILL).convert('P')
+    img.putpalette([0, 0, 0, 255, 255, 255])
+    return img
+
+def add_logo_to_qr(qr_img, logo_img=None, size_ratio=0.2, position='center', shape='square', border=True, border_color='white', opacity=1.0,
+                   palette=False, logo_bytes=None):
     """Add logo to QR code with advanced customization"""
-    # Convert to RGBA if not already
-    qr_img = qr_img.convert("RGBA")
+    if palette and qr_img.mode in ('1', 'P'):
+        # The QR stays opaque, so RGB is enough to carry the logo colours
+        qr_img = qr_img.convert("RGB")
+    else:
+        # Convert to RGBA if not already
+        qr_img = qr_img.convert("RGBA")
     
-    # Resize logo
     qr_width, qr_height = qr_img.size
     logo_size = int(min(qr_width, qr_height) * size_ratio)
+    
+    if logo_bytes is not None:
+        # Raw logo bytes let repeat renders reuse the prepared tile
+        cache_key = make_logo_key(logo_bytes, logo_size, shape, border, border_color, opacity)
+        logo_img = logo_cache.get(cache_key)
+        if logo_img is None:
+            logo_img = prepare_logo(Image.open(io.BytesIO(logo_bytes)), logo_size, shape, border, border_color, opacity)
+            logo_cache.set(cache_key, logo_img)
+    else:
+        logo_img = prepare_logo(logo_img, logo_size, shape, border, border_color, opacity)
+    
+    # Calculate position
+    pos_x, pos_y = logo_position(qr_width, qr_height, logo_img.width, position)
+    
+    # Paste the logo onto the QR code
+    qr_img.paste(logo_img, (pos_x, pos_y), logo_img if logo_img.mode == 'RGBA' else None)
+    
+    return qr_img
+
+def prepare_logo(logo_img, logo_size, shape='square', border=True, border_color='white', opacity=1.0):
+    """Resize, mask, border and fade a logo into the tile pasted onto the QR code"""
+    # Resize logo
     logo_img = logo_img.resize((logo_size, logo_size), Image.LANCZOS)
     
     # Convert logo to RGBA if not already
@@ -71,9 +159,8 @@ def add_logo_to_qr(qr_img, logo_img, size_ratio=0.2, position='center', shape='s
         border_y = (border_size - logo_size) // 2
         border_img.paste(logo_img, (border_x, border_y), logo_img if logo_img.mode == 'RGBA' else None)
         
-        # Update logo_img and logo_size
+        # Update logo_img
         logo_img = border_img
-        logo_size = border_size
     
     # Apply opacity if needed
     if opacity < 1.0:
@@ -83,7 +170,10 @@ def add_logo_to_qr(qr_img, logo_img, size_ratio=0.2, position='center', shape='s
         # Blend the logo with the transparent image
         logo_img = Image.blend(opacity_img, logo_img, opacity)
     
-    # Calculate position
+    return logo_img
+
+def logo_position(qr_width, qr_height, logo_size, position='center'):
+    """Get the top-left corner for a logo at a named position"""
     if position == 'center':
         pos_x = (qr_width - logo_size) // 2
         pos_y = (qr_height - logo_size) // 2
@@ -103,17 +193,22 @@ def add_logo_to_qr(qr_img, logo_img, size_ratio=0.2, position='center', shape='s
         pos_x = (qr_width - logo_size) // 2
         pos_y = (qr_height - logo_size) // 2
     
-    # Paste the logo onto the QR code
-    qr_img.paste(logo_img, (pos_x, pos_y), logo_img if logo_img.mode == 'RGBA' else None)
-    
-    return qr_img
+    return pos_x, pos_y
 
 def add_frame_and_text(qr_img, frame_color, text, text_color, frame_style='square', frame_width=50, 
-                      font_size=20, font_family=None, text_position='bottom', add_timestamp=False):
+                      font_size=20, font_family=None, text_position='bottom', add_timestamp=False, palette=False):
     """Add frame and text to QR code with advanced customization"""
-    # Convert to RGB if not already
-    if qr_img.mode != 'RGB':
-        qr_img = qr_img.convert('RGB')
+    # Keep 1-bit and palette QR codes in palette mode when requested
+    palette = palette and qr_img.mode in ('1', 'P')
+    
+    if palette:
+        qr_img = to_qr_palette(qr_img)
+        text_fill = PALETTE_TEXT
+    else:
+        # Convert to RGB if not already
+        if qr_img.mode != 'RGB':
+            qr_img = qr_img.convert('RGB')
+        text_fill = text_color
     
     # Get QR code dimensions
     qr_width, qr_height = qr_img.size
@@ -131,15 +226,21 @@ def add_frame_and_text(qr_img, frame_color, text, text_color, frame_style='squar
         else:  # left or right
             new_width += text_height
     
-    # Create new image with frame
-    if frame_style == 'square':
-        framed_img = Image.new('RGB', (new_width, new_height), frame_color)
-    elif frame_style == 'rounded':
-        framed_img = Image.new('RGB', (new_width, new_height), frame_color)
-        # We'll apply rounded corners later
-    else:  # circle
-        framed_img = Image.new('RGB', (new_width, new_height), frame_color)
-        # We'll apply circular mask later
+    # Start from a cached template for this frame geometry
+    template = frame_templates.get(
+        new_width, new_height, frame_style, frame_color, frame_width,
+        palette_index=PALETTE_FRAME if palette else None
+    )
+    framed_img = template.background.copy()
+    
+    if palette:
+        # QR colours first, then frame, text and the transparent corner entry
+        framed_img.putpalette(
+            qr_img.getpalette()[:6]
+            + list(ImageColor.getcolor(frame_color, 'RGB'))
+            + list(ImageColor.getcolor(text_color, 'RGB'))
+            + [0, 0, 0]
+        )
     
     # Paste QR code onto frame
     paste_x = frame_width
@@ -154,20 +255,13 @@ def add_frame_and_text(qr_img, frame_color, text, text_color, frame_style='squar
     # Add text if provided
     if text:
         try:
-            # Try to load the specified font, fall back to default if not available
-            if font_family:
-                try:
-                    font = ImageFont.truetype(font_family, font_size)
-                except IOError:
-                    font = ImageFont.load_default()
-            else:
-                # Use default font
-                font = ImageFont.load_default()
+            # Fonts come from the registry, which falls back to the default font
+            font = get_font(font_family, font_size)
             
             draw = ImageDraw.Draw(framed_img)
             
             # Calculate text position
-            text_width, text_height_actual = draw.textsize(text, font=font)
+            text_width, text_height_actual = measure_text(text, font)
             
             if text_position == 'bottom':
                 text_x = (new_width - text_width) // 2
@@ -189,7 +283,8 @@ def add_frame_and_text(qr_img, frame_color, text, text_color, frame_style='squar
             # Add timestamp if requested
             if add_timestamp:
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-                timestamp_width, timestamp_height = draw.textsize(timestamp, font=ImageFont.load_default())
+                timestamp_font = get_font()
+                timestamp_width, timestamp_height = measure_text(timestamp, timestamp_font)
                 
                 if text_position in ['top', 'bottom']:
                     timestamp_x = new_width - timestamp_width - 10
@@ -198,36 +293,205 @@ def add_frame_and_text(qr_img, frame_color, text, text_color, frame_style='squar
                     timestamp_x = text_x
                     timestamp_y = text_y + text_height_actual + 5
                 
-                draw.text((timestamp_x, timestamp_y), timestamp, fill=text_color, font=ImageFont.load_default())
+                draw.text((timestamp_x, timestamp_y), timestamp, fill=text_fill, font=timestamp_font)
             
             # Draw the main text
-            draw.text((text_x, text_y), text, fill=text_color, font=font)
+            draw.text((text_x, text_y), text, fill=text_fill, font=font)
             
         except Exception as e:
             print(f"Error adding text: {str(e)}")
     
-    # Apply rounded corners if needed
-    if frame_style == 'rounded':
-        # Create a mask with rounded corners
-        mask = Image.new('L', (new_width, new_height), 0)
-        draw = ImageDraw.Draw(mask)
-        radius = frame_width
-        draw.rounded_rectangle([(0, 0), (new_width, new_height)], radius, fill=255)
-        
-        # Apply the mask
-        framed_img.putalpha(mask)
+    # Apply the cached rounded or circular mask if needed
+    if template.mask is not None:
+        apply_frame_mask(framed_img, template, palette)
     
-    # Apply circular mask if needed
-    if frame_style == 'circle':
-        # Create a circular mask
-        mask = Image.new('L', (new_width, new_height), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0, new_width, new_height), fill=255)
+    return framed_img
+
+def apply_frame_mask(framed_img, template, palette=False):
+    """Make everything outside the template's frame mask transparent"""
+    if palette:
+        # Palette images mark the corners with a transparent palette entry
+        framed_img.paste(PALETTE_TRANSPARENT, mask=template.outside_mask)
+        framed_img.info['transparency'] = PALETTE_TRANSPARENT
+    else:
+        framed_img.putalpha(template.mask)
+
+def decode_logo_data(options):
+    """Decode the base64 logo from request options, if any"""
+    logo_data = (options.get('logo') or {}).get('data')
+    if not logo_data:
+        return None
+    
+    return base64.b64decode(logo_data.split(',')[1] if ',' in logo_data else logo_data)
+
+def svg_module_path(matrix):
+    """Merge runs of dark modules into horizontal strokes along each row's centre line, in module units"""
+    segments = []
+    pen_x, pen_y = None, None
+    for row, modules in enumerate(matrix):
+        col = 0
+        width = len(modules)
+        while col < width:
+            if not modules[col]:
+                col += 1
+                continue
+            
+            # Extend the run across adjacent dark modules
+            start = col
+            while col < width and modules[col]:
+                col += 1
+            
+            # Only the first move is absolute; later ones are relative to where the last run ended
+            if pen_x is None:
+                segments.append(f"M{start} {row + 0.5:g}h{col - start}")
+            else:
+                segments.append(f"m{start - pen_x} {row - pen_y}h{col - start}")
+            pen_x, pen_y = col, row
+    
+    return ''.join(segments)
+
+def render_qr_svg(data, options, logo_bytes=None):
+    """Render request options as a compact SVG document"""
+    qr = build_qr(
+        data,
+        error_correction=options.get('error_correction', 'M'),
+        version=options.get('version'),
+        box_size=options.get('box_size', 10),
+        border=options.get('border', 4)
+    )
+    
+    # get_matrix() already includes the quiet zone border modules
+    matrix = qr.get_matrix()
+    box_size = qr.box_size
+    qr_size = len(matrix) * box_size
+    fill_color = escape(str(options.get('fill_color', 'black')), SVG_ATTR_ENTITIES)
+    back_color = escape(str(options.get('back_color', 'white')), SVG_ATTR_ENTITIES)
+    
+    # Frame and text use the same geometry as add_frame_and_text
+    frame_options = options.get('frame') or {}
+    frame_width = frame_options.get('width', 50) if frame_options else 0
+    text = frame_options.get('text', '')
+    font_size = 20
+    text_height = font_size + 20 if text else 0
+    width = qr_size + 2 * frame_width
+    height = qr_size + 2 * frame_width + text_height
+    
+    elements = []
+    if frame_options:
+        frame_color = escape(str(frame_options.get('color', '#4CAF50')), SVG_ATTR_ENTITIES)
+        frame_style = frame_options.get('style', 'square')
+        if frame_style == 'circle':
+            elements.append(f'<ellipse cx="{width / 2:g}" cy="{height / 2:g}" rx="{width / 2:g}" ry="{height / 2:g}" fill="{frame_color}"/>')
+        else:
+            radius = f' rx="{frame_width}"' if frame_style == 'rounded' else ''
+            elements.append(f'<rect width="{width}" height="{height}"{radius} fill="{frame_color}"/>')
+    
+    elements.append(f'<rect x="{frame_width}" y="{frame_width}" width="{qr_size}" height="{qr_size}" fill="{back_color}"/>')
+    elements.append(
+        f'<path transform="translate({frame_width} {frame_width}) scale({box_size})" '
+        f'd="{svg_module_path(matrix)}" fill="none" stroke="{fill_color}" stroke-width="1"/>'
+    )
+    
+    # Embed the logo as-is rather than rasterizing it into the modules
+    if logo_bytes:
+        logo_options = options.get('logo') or {}
+        logo_size = int(qr_size * logo_options.get('size', 0.2))
+        logo_format = Image.open(io.BytesIO(logo_bytes)).format or 'PNG'
+        pos_x, pos_y = logo_position(qr_size, qr_size, logo_size, logo_options.get('position', 'center'))
+        pos_x += frame_width
+        pos_y += frame_width
         
-        # Apply the mask
-        framed_img.putalpha(mask)
+        if logo_options.get('border', True):
+            border_size = int(logo_size * 1.1)
+            border_offset = (border_size - logo_size) // 2
+            elements.append(
+                f'<rect x="{pos_x - border_offset}" y="{pos_y - border_offset}" '
+                f'width="{border_size}" height="{border_size}" fill="white"/>'
+            )
+        
+        clip = ''
+        if logo_options.get('shape', 'square') == 'circle':
+            radius = logo_size / 2
+            elements.append(
+                f'<clipPath id="logo-clip"><circle cx="{pos_x + radius:g}" cy="{pos_y + radius:g}" r="{radius:g}"/></clipPath>'
+            )
+            clip = ' clip-path="url(#logo-clip)"'
+        
+        logo_href = f"data:image/{logo_format.lower()};base64,{base64.b64encode(logo_bytes).decode('utf-8')}"
+        elements.append(
+            f'<image x="{pos_x}" y="{pos_y}" width="{logo_size}" height="{logo_size}"{clip} href="{logo_href}"/>'
+        )
     
-    return framed_img
+    if text:
+        text_color = escape(str(frame_options.get('text_color', '#FFFFFF')), SVG_ATTR_ENTITIES)
+        text_y = qr_size + 2 * frame_width + text_height / 2
+        elements.append(
+            f'<text x="{width / 2:g}" y="{text_y:g}" font-size="{font_size}" font-family="sans-serif" '
+            f'text-anchor="middle" dominant-baseline="middle" fill="{text_color}">{escape(text)}</text>'
+        )
+    
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" shape-rendering="crispEdges">'
+        + ''.join(elements)
+        + '</svg>'
+    )
+    return svg.encode('utf-8')
+
+def render_qr_image(data, options, logo_bytes=None, image_format='png'):
+    """Run the full generation pipeline for request options and return encoded image bytes"""
+    if image_format == 'svg':
+        return render_qr_svg(data, options, logo_bytes)
+    
+    palette = options.get('color_mode') == 'palette'
+    
+    # Generate basic QR code
+    qr_img = generate_qr_code(
+        data,
+        error_correction=options.get('error_correction', 'M'),
+        version=options.get('version'),
+        box_size=options.get('box_size', 10),
+        border=options.get('border', 4),
+        renderer=options.get('renderer', 'pil'),
+        palette=palette,
+        fill_color=options.get('fill_color', 'black'),
+        back_color=options.get('back_color', 'white')
+    )
+    
+    # Add logo if provided
+    if logo_bytes:
+        logo_options = options.get('logo') or {}
+        
+        qr_img = add_logo_to_qr(
+            qr_img,
+            logo_bytes=logo_bytes,
+            size_ratio=logo_options.get('size', 0.2),
+            position=logo_options.get('position', 'center'),
+            shape=logo_options.get('shape', 'square'),
+            border=logo_options.get('border', True),
+            palette=palette
+        )
+    
+    # Add frame and text if provided
+    if options.get('frame'):
+        frame_options = options['frame']
+        qr_img = add_frame_and_text(
+            qr_img,
+            frame_color=frame_options.get('color', '#4CAF50'),
+            text=frame_options.get('text', ''),
+            text_color=frame_options.get('text_color', '#FFFFFF'),
+            frame_style=frame_options.get('style', 'square'),
+            frame_width=frame_options.get('width', 50),
+            palette=palette
+        )
+    
+    # Encode the final image
+    buffered = io.BytesIO()
+    if image_format == 'webp':
+        qr_img.save(buffered, format="WEBP", lossless=True)
+    else:
+        qr_img.save(buffered, format="PNG")
+    return buffered.getvalue()
 
 def create_qr_for_type(qr_type, content):
     """Create QR code data based on type with enhanced formatting"""
@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Render cache settings
+RENDER_CACHE_MAX_BYTES = int(os.getenv('QR_RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RENDER_CACHE_DIR = os.getenv('QR_RENDER_CACHE_DIR')
+
+def make_render_key(data, options, logo_bytes=None, image_format='png'):
+    """Build a canonical content hash for a QR render request"""
+    logo_options = options.get('logo') or {}
+    frame_options = options.get('frame') or {}
+
+    # The renderer option is left out on purpose: every engine yields identical pixels
+    key_data = {
+        'format': image_format,
+        'data': data,
+        'error_correction': str(options.get('error_correction', 'M')).upper(),
+        'version': options.get('version'),
+        'box_size': options.get('box_size', 10),
+        'border': options.get('border', 4),
+        'color_mode': options.get('color_mode', 'rgb'),
+        'fill_color': options.get('fill_color', 'black'),
+        'back_color': options.get('back_color', 'white'),
+        'logo': {
+            'digest': hashlib.sha256(logo_bytes).hexdigest(),
+            'size': logo_options.get('size', 0.2),
+            'position': logo_options.get('position', 'center'),
+            'shape': logo_options.get('shape', 'square'),
+            'border': logo_options.get('border', True)
+        } if logo_bytes else None,
+        'frame': {
+            'color': frame_options.get('color', '#4CAF50'),
+            'text': frame_options.get('text', ''),
+            'text_color': frame_options.get('text_color', '#FFFFFF'),
+            'style': frame_options.get('style', 'square'),
+            'width': frame_options.get('width', 50)
+        } if frame_options else None
+    }
+
+    canonical = json.dumps(key_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class RenderCache:
+    """Size-bounded LRU cache of encoded QR images with an optional disk tier
+
+    Entries are keyed by render key and image format, so bytes are only ever
+    served as the format they were encoded in.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES, disk_dir=RENDER_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        render_key, image_format = key
+        return os.path.join(self.disk_dir, f"{render_key}.{image_format}")
+
+    def get(self, render_key, image_format='png'):
+        """Return cached bytes for a render key in the given format, or None on a miss"""
+        key = (render_key, image_format)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        # Fall back to the disk tier
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    value = f.read()
+            except OSError:
+                value = None
+
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, render_key, value, image_format='png'):
+        """Store the bytes of a render in the given format in memory and on disk"""
+        key = (render_key, image_format)
+        self._store(key, value)
+
+        if self.disk_dir:
+            try:
+                tmp_path = f"{self._disk_path(key)}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(value)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"Error writing render cache entry: {str(e)}")
+
+    def _store(self, key, value):
+        # Entries larger than the whole budget are never kept in memory
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            old_value = self._entries.pop(key, None)
+            if old_value is not None:
+                self._size -= len(old_value)
+
+            self._entries[key] = value
+            self._size += len(value)
+
+            # Evict least recently used entries until we fit the budget
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all in-memory entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+# Process-wide render cache
+render_cache = RenderCache()
@@ -0,0 +1,248 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+from app.utils.db_utils import get_db, record_scan_rollups
+
+# Load environment variables
+load_dotenv()
+
+# Scan ingestion settings; the flush interval bounds how long a scan waits before it is written
+SCAN_QUEUE_SIZE = int(os.getenv('SCAN_QUEUE_SIZE', 10000))
+SCAN_BATCH_SIZE = int(os.getenv('SCAN_BATCH_SIZE', 500))
+SCAN_FLUSH_INTERVAL = float(os.getenv('SCAN_FLUSH_INTERVAL', 0.1))
+SCAN_ENQUEUE_TIMEOUT = float(os.getenv('SCAN_ENQUEUE_TIMEOUT', 0.05))
+SCAN_MAX_ATTEMPTS = int(os.getenv('SCAN_MAX_ATTEMPTS', 3))
+SCAN_BACKOFF_SECONDS = float(os.getenv('SCAN_BACKOFF_SECONDS', 0.5))
+
+# Stored scans whose rollup counters are still owed; beyond this the oldest are dropped and need a rebuild
+SCAN_ROLLUP_BACKLOG_SIZE = int(os.getenv('SCAN_ROLLUP_BACKLOG_SIZE', 100000))
+
+# Server error code for a duplicate _id, which on a retry means the scan was already written
+DUPLICATE_KEY_ERROR = 11000
+
+class ScanIngestQueue:
+    """Bounded queue of scan documents written to MongoDB in batches by a background worker"""
+
+    def __init__(self, max_size=SCAN_QUEUE_SIZE, batch_size=SCAN_BATCH_SIZE, flush_interval=SCAN_FLUSH_INTERVAL,
+                 enqueue_timeout=SCAN_ENQUEUE_TIMEOUT, max_attempts=SCAN_MAX_ATTEMPTS,
+                 backoff=SCAN_BACKOFF_SECONDS, rollup_backlog_size=SCAN_ROLLUP_BACKLOG_SIZE, collection=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.rollup_backlog_size = rollup_backlog_size
+        self.collection = collection
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._rollup_backlog = []
+        self.enqueued = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.rollup_errors = 0
+        self.rollups_dropped = 0
+
+    def _get_collection(self):
+        if self.collection is not None:
+            return self.collection
+        return get_db().qr_scans
+
+    def _ensure_worker(self):
+        # The worker is started on the first scan so importing the module stays cheap
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="scan-ingest", daemon=True)
+                self._thread.start()
+
+    def submit(self, scan):
+        """Queue a scan document; returns False when the queue stays full, so the caller can write it directly"""
+        if self._stop.is_set():
+            return False
+        self._ensure_worker()
+
+        # Fixing the _id up front makes retried inserts idempotent
+        scan.setdefault('_id', ObjectId())
+
+        try:
+            # Backpressure: wait briefly for the worker to make room before giving up
+            self._queue.put(scan, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def add_rollups(self, scans):
+        """Hand the worker stored scans whose rollup counters it should record"""
+        with self._lock:
+            self._rollup_backlog.extend(scans)
+        self._ensure_worker()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._rollup_backlog:
+                # Owed rollups are retried even while no new scans arrive
+                with self._flush_lock:
+                    self._record_rollups([])
+
+    def _take_batch(self):
+        # Block for the first scan, then collect more until the batch is full or the interval ends
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Insert a batch with insert_many(ordered=False), retrying only the scans that failed"""
+        with self._flush_lock:
+            start = time.perf_counter()
+            pending = batch
+            attempts = 0
+
+            while pending and attempts < self.max_attempts:
+                attempts += 1
+                try:
+                    self._get_collection().insert_many(pending, ordered=False)
+                    pending = []
+                except BulkWriteError as e:
+                    failed = {error['index'] for error in e.details.get('writeErrors', [])
+                              if error.get('code') != DUPLICATE_KEY_ERROR}
+                    pending = [scan for index, scan in enumerate(pending) if index in failed]
+                except Exception as e:
+                    print(f"Error flushing scans: {str(e)}")
+
+                if pending:
+                    with self._lock:
+                        self.flush_errors += 1
+                    if attempts < self.max_attempts:
+                        time.sleep(self.backoff * (2 ** (attempts - 1)))
+
+            if pending:
+                print(f"Error flushing scans: dropped {len(pending)} after {attempts} attempts")
+                dropped_ids = {scan['_id'] for scan in pending}
+                stored = [scan for scan in batch if scan['_id'] not in dropped_ids]
+            else:
+                stored = batch
+
+            self._record_rollups(stored)
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.flushes += 1
+                self.inserted += len(stored)
+                self.dropped += len(pending)
+                self.last_batch_size = len(batch)
+                self.last_flush_seconds = elapsed
+                self.total_flush_seconds += elapsed
+            return len(stored)
+
+    def _record_rollups(self, scans):
+        """Update rollup counters for stored scans and any still owed, retrying failures with backoff"""
+        with self._lock:
+            pending = self._rollup_backlog + scans
+            self._rollup_backlog = []
+        
+        attempts = 0
+        while pending and attempts < self.max_attempts:
+            attempts += 1
+            pending = record_scan_rollups(pending)
+            if pending:
+                with self._lock:
+                    self.rollup_errors += 1
+                if attempts < self.max_attempts:
+                    time.sleep(self.backoff * (2 ** (attempts - 1)))
+        
+        if not pending:
+            return
+        
+        # Whatever is left is retried on the next flush, so rollups never silently fall behind
+        with self._lock:
+            backlog = pending + self._rollup_backlog
+            overflow = max(0, len(backlog) - self.rollup_backlog_size)
+            if overflow:
+                print(f"Error updating scan rollups: dropped {overflow}; rebuild the rollups to recover")
+                self.rollups_dropped += overflow
+            self._rollup_backlog = backlog[overflow:]
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                if self._rollup_backlog:
+                    with self._flush_lock:
+                        self._record_rollups([])
+                return written
+            written += self._write(batch)
+
+    def stop(self):
+        """Stop the worker and flush the scans still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2 + 1)
+        return self.flush()
+
+    def stats(self):
+        """Get queue depth, outcome counters and flush latency"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_size': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'inserted': self.inserted,
+                'dropped': self.dropped,
+                'flushes': self.flushes,
+                'flush_errors': self.flush_errors,
+                'last_batch_size': self.last_batch_size,
+                'last_flush_seconds': self.last_flush_seconds,
+                'avg_flush_seconds': self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'rollup_backlog': len(self._rollup_backlog),
+                'rollup_errors': self.rollup_errors,
+                'rollups_dropped': self.rollups_dropped
+            }
+
+# Process-wide scan ingestion queue, flushed on shutdown
+scan_queue = ScanIngestQueue()
+atexit.register(scan_queue.stop)
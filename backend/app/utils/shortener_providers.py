@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote
+from dotenv import load_dotenv
+from app.utils.circuit_breaker import CircuitBreaker, OPEN
+from app.utils.http_client import HTTPClient
+
+# Load environment variables
+load_dotenv()
+
+# Shortener settings; 'race' fires providers concurrently, 'sequential' tries them one by one
+SHORTENER_MODE = os.getenv('SHORTENER_MODE', 'race')
+SHORTENER_TIMEOUT = float(os.getenv('SHORTENER_TIMEOUT', 5))
+SHORTENER_HEDGE_DELAY = float(os.getenv('SHORTENER_HEDGE_DELAY', 0))
+
+# Circuit breaker settings per provider
+SHORTENER_BREAKER_FAILURES = int(os.getenv('SHORTENER_BREAKER_FAILURES', 3))
+SHORTENER_BREAKER_RESET_SECONDS = float(os.getenv('SHORTENER_BREAKER_RESET_SECONDS', 30))
+SHORTENER_BREAKER_HALF_OPEN_CALLS = int(os.getenv('SHORTENER_BREAKER_HALF_OPEN_CALLS', 1))
+
+# External shortener APIs in their default order of preference
+DEFAULT_PROVIDERS = [
+    ('TinyURL', "https://tinyurl.com/api-create.php?url={url}"),
+    ('is.gd', "https://is.gd/create.php?format=simple&url={url}"),
+    ('v.gd', "https://v.gd/create.php?format=simple&url={url}")
+]
+
+# Pooled client for the shortener APIs; racing and the breakers handle failover, so it does not retry
+shortener_client = HTTPClient(max_retries=0)
+
+# Weight of the newest sample in the moving latency average
+LATENCY_SMOOTHING = 0.3
+
+class ShortenerProvider:
+    """One external shortener API with its circuit breaker and latency and error counters"""
+
+    def __init__(self, name, api_template, breaker=None):
+        self.name = name
+        self.api_template = api_template
+        self.breaker = breaker or CircuitBreaker(
+            SHORTENER_BREAKER_FAILURES, SHORTENER_BREAKER_RESET_SECONDS, SHORTENER_BREAKER_HALF_OPEN_CALLS
+        )
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.wins = 0
+        self.consecutive_errors = 0
+        self.avg_latency = None
+        self.last_error = None
+
+    def request(self, url, timeout):
+        """Call the API and return the short URL it produced"""
+        start = time.perf_counter()
+        try:
+            response = shortener_client.get(self.api_template.format(url=quote(url)), timeout=timeout)
+            short_url = response.text.strip()
+            if response.status_code != 200 or not short_url.startswith(('http://', 'https://')):
+                raise ValueError(f"Unexpected response: {response.status_code}")
+        except Exception as e:
+            self.record(time.perf_counter() - start, e)
+            raise
+
+        self.record(time.perf_counter() - start)
+        return short_url
+
+    def record(self, latency, error=None):
+        """Update counters and the circuit breaker after a request"""
+        if error is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        
+        with self._lock:
+            self.requests += 1
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            else:
+                self.avg_latency += LATENCY_SMOOTHING * (latency - self.avg_latency)
+
+            if error is None:
+                self.successes += 1
+                self.consecutive_errors = 0
+                return
+
+            self.errors += 1
+            self.consecutive_errors += 1
+            self.last_error = str(error)
+
+    def record_win(self):
+        """Count a race this provider answered first"""
+        with self._lock:
+            self.wins += 1
+
+    def rank(self):
+        """Sort key: providers with a closed or probing breaker first, then by moving average latency"""
+        is_open = self.breaker.state == OPEN
+        with self._lock:
+            latency = self.avg_latency if self.avg_latency is not None else 0.0
+            return (is_open, latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'requests': self.requests,
+                'successes': self.successes,
+                'errors': self.errors,
+                'wins': self.wins,
+                'error_rate': self.errors / self.requests if self.requests else 0.0,
+                'avg_latency': self.avg_latency,
+                'consecutive_errors': self.consecutive_errors,
+                'last_error': self.last_error,
+                'breaker': self.breaker.stats()
+            }
+
+class ShortenerRacer:
+    """Shorten URLs through several providers at once and keep the first valid answer"""
+
+    def __init__(self, providers=None, mode=SHORTENER_MODE, timeout=SHORTENER_TIMEOUT,
+                 hedge_delay=SHORTENER_HEDGE_DELAY):
+        if providers is None:
+            providers = [ShortenerProvider(name, api_template) for name, api_template in DEFAULT_PROVIDERS]
+        self.providers = providers
+        self.mode = mode
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=len(providers) * 4, thread_name_prefix="shortener")
+
+    def ranked(self):
+        """Providers in the order they should be tried"""
+        return sorted(self.providers, key=lambda provider: provider.rank())
+
+    def shorten(self, url):
+        """Return (short_url, provider_name), or (None, errors) when every provider failed"""
+        # Providers with an open breaker are skipped without a request; half-open ones get a probe
+        allowed = []
+        errors = []
+        for provider in self.ranked():
+            if provider.breaker.allow_request():
+                allowed.append(provider)
+            else:
+                errors.append(f"{provider.name} error: circuit open")
+        
+        if self.mode == 'sequential':
+            short_url, result = self.shorten_sequential(url, allowed)
+        else:
+            short_url, result = self.race(url, allowed)
+        
+        return (short_url, result) if short_url else (None, errors + result)
+
+    def shorten_sequential(self, url, providers):
+        errors = []
+        for i, provider in enumerate(providers):
+            try:
+                short_url = provider.request(url, self.timeout)
+            except Exception as e:
+                errors.append(f"{provider.name} error: {str(e)}")
+                continue
+            
+            provider.record_win()
+            # Probe slots reserved for providers that were never called are handed back
+            for skipped in providers[i + 1:]:
+                skipped.breaker.release()
+            return short_url, provider.name
+        return None, errors
+
+    def race(self, url, providers):
+        """Fire providers in ranked order, hedge_delay apart, and return the first valid short URL"""
+        errors = []
+        if not providers:
+            return None, errors
+
+        deadline = time.monotonic() + self.timeout
+        pending = {}
+        waiting = list(providers)
+
+        def abandon():
+            # Requests already on the wire finish in the background and still feed the stats
+            for future, provider in pending.items():
+                if future.cancel():
+                    provider.breaker.release()
+            for provider in waiting:
+                provider.breaker.release()
+
+        while waiting or pending:
+            # Launch the next provider straight away, or once the hedge delay passes without an answer
+            if waiting:
+                provider = waiting.pop(0)
+                pending[self._executor.submit(provider.request, url, self.timeout)] = provider
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = min(self.hedge_delay, remaining) if waiting else remaining
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    short_url = future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name} error: {str(e)}")
+                    continue
+
+                abandon()
+                provider.record_win()
+                return short_url, provider.name
+
+        for provider in pending.values():
+            errors.append(f"{provider.name} error: timed out")
+        abandon()
+        return None, errors
+
+    def get(self, name):
+        """Get a provider by name"""
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    def stats(self):
+        """Get per-provider counters in ranked order"""
+        return {
+            'mode': self.mode,
+            'timeout': self.timeout,
+            'hedge_delay': self.hedge_delay,
+            'providers': [provider.stats() for provider in self.ranked()]
+        }
+
+# Process-wide shortener racer
+shortener_racer = ShortenerRacer()
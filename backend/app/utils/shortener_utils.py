@@ -1,11 +1,13 @@
-import requests
-import uuid
-import hashlib
 from datetime import datetime
-from urllib.parse import quote, urlparse
+from urllib.parse import urlparse
 import os
 from dotenv import load_dotenv
-from app.utils.db_utils import store_url, get_url, get_all_urls, update_url
+from app.utils.db_utils import store_url, get_url, get_all_urls, update_url, find_url_by_original, LOCAL_REDIRECT_PATH
+from app.utils.click_buffer import click_buffer
+from app.utils.url_cache import redirect_cache, shorten_cache
+from app.utils.url_utils import normalize_url
+from app.utils.shortener_providers import shortener_racer
+from app.utils.id_allocator import short_id_allocator
 
 # Load environment variables
 load_dotenv()
@@ -13,70 +15,70 @@ load_dotenv()
 # Base URL for the application
 BASE_URL = os.getenv('BACKEND_URL', 'http://localhost:5000')
 
+# 'external' shortens through the provider race with local links as fallback; 'local' only issues local links
+SHORTENER_ENGINE = os.getenv('SHORTENER_ENGINE', 'external')
+
 def create_short_url(url):
-    """Create a short URL using external URL shortener services"""
+    """Create a short URL with the local allocator or external URL shortener services"""
     # Validate URL format
-    if not url.startswith(('http://', 'https://')):
+    if not url.lower().startswith(('http://', 'https://')):
         url = 'https://' + url
     
-    # Try multiple URL shortener services in case one fails
+    # Repeat requests for the same destination reuse the existing short link
+    canonical_url = normalize_url(url)
+    short_url = shorten_cache.get(canonical_url)
+    if short_url:
+        return short_url
+    
+    existing = find_url_by_original(url)
+    if existing:
+        shorten_cache.set(canonical_url, existing['short_url'])
+        return existing['short_url']
+    
     short_url = None
-    error_message = ""
+    if SHORTENER_ENGINE == 'external':
+        # Race the external shortener services; the first valid answer wins
+        short_url, result = shortener_racer.shorten(url)
+        if not short_url:
+            print(f"External shorteners failed: {'; '.join(result)}")
     
-    # Option 1: TinyURL API
+    # Every link gets a collision-free ID from the block allocator, also used by /redirect
     try:
-        tinyurl_api = f"https://tinyurl.com/api-create.php?url={quote(url)}"
-        response = requests.get(tinyurl_api, timeout=5)
-        if response.status_code == 200:
-            short_url = response.text.strip()
+        short_id = short_id_allocator.next_id()
     except Exception as e:
-        error_message += f"TinyURL error: {str(e)}\n"
-    
-    # Option 2: Bitly-like service (is.gd)
-    if not short_url:
-        try:
-            isgd_api = f"https://is.gd/create.php?format=simple&url={quote(url)}"
-            response = requests.get(isgd_api, timeout=5)
-            if response.status_code == 200:
-                short_url = response.text.strip()
-        except Exception as e:
-            error_message += f"is.gd error: {str(e)}\n"
-    
-    # Option 3: v.gd service (similar to is.gd)
-    if not short_url:
-        try:
-            vgd_api = f"https://v.gd/create.php?format=simple&url={quote(url)}"
-            response = requests.get(vgd_api, timeout=5)
-            if response.status_code == 200:
-                short_url = response.text.strip()
-        except Exception as e:
-            error_message += f"v.gd error: {str(e)}\n"
+        # An external link works without a stored ID; a local one cannot be issued
+        print(f"Error allocating short ID: {str(e)}")
+        return short_url
     
-    # Fallback to local shortener if all external services fail
+    # Local links are the primary engine, or the fallback when all external services fail
     if not short_url:
-        # Generate a unique short ID
-        short_id = str(uuid.uuid4())[:8]
-        short_url = f"{BASE_URL}/api/url/redirect/{short_id}"
-        print(f"Using local shortener as fallback: {short_url}")
-        
-        # Store in database
-        store_url(short_id, url, short_url)
-        
-        return short_url
+        short_url = f"{BASE_URL}{LOCAL_REDIRECT_PATH}{short_id}"
+        if SHORTENER_ENGINE == 'external':
+            print(f"Using local shortener as fallback: {short_url}")
     
-    # Store the external short URL in our database for tracking
-    if short_url:
-        short_id = hashlib.md5(short_url.encode()).hexdigest()[:8]
-        store_url(short_id, url, short_url)
+    # Store in database for tracking
+    store_url(short_id, url, short_url)
+    redirect_cache.invalidate(short_id)
+    shorten_cache.set(canonical_url, short_url)
     
     return short_url
 
 def get_original_url(short_id):
-    """Get the original URL for a short ID from the database"""
-    url_data = get_url(short_id)
+    """Get the original URL for a short ID, served from the redirect cache when hot"""
+    original_url = redirect_cache.get(short_id)
+    if original_url is not None:
+        # Skip the lookup; the click is counted by the write-behind buffer
+        click_buffer.record(short_id)
+        return original_url
+    
+    url_data = get_url(short_id, count_scan=False)
     
     if url_data:
-        return url_data.get('original_url')
+        click_buffer.record(short_id)
+        original_url = url_data.get('original_url')
+        if original_url:
+            redirect_cache.set(short_id, original_url)
+        return original_url
     
     return None
 
@@ -99,4 +101,14 @@ def get_all_short_urls():
 
 def update_original_url(short_id, new_url):
     """Update the destination URL for a short ID"""
-    return update_url(short_id, new_url)
+    previous = get_url(short_id, count_scan=False)
+    success = update_url(short_id, new_url)
+    
+    # Drop the cached destination so redirects pick up the change
+    redirect_cache.invalidate(short_id)
+    
+    # The short link no longer answers for its old destination
+    if previous and previous.get('original_url'):
+        shorten_cache.invalidate(normalize_url(previous['original_url']))
+    
+    return success
@@ -0,0 +1,216 @@
+import io
+import os
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+from collections import OrderedDict
+import cloudinary
+import cloudinary.uploader
+from dotenv import load_dotenv
+from app.utils.db_utils import get_db
+
+# Load environment variables
+load_dotenv()
+
+# Upload queue settings
+UPLOAD_WORKERS = int(os.getenv('QR_UPLOAD_WORKERS', 4))
+UPLOAD_QUEUE_SIZE = int(os.getenv('QR_UPLOAD_QUEUE_SIZE', 1000))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv('QR_UPLOAD_MAX_ATTEMPTS', 3))
+UPLOAD_BACKOFF_SECONDS = float(os.getenv('QR_UPLOAD_BACKOFF_SECONDS', 0.5))
+UPLOAD_MAX_TRACKED_JOBS = int(os.getenv('QR_UPLOAD_MAX_TRACKED_JOBS', 10000))
+
+# Longest a status poll may hold a request open; only the worker that queued the job can wait on it
+UPLOAD_STATUS_MAX_WAIT = float(os.getenv('QR_UPLOAD_STATUS_MAX_WAIT', 5))
+
+def cloudinary_upload(image_bytes, folder, mimetype):
+    """Upload raw image bytes to Cloudinary and return the secure URL"""
+    upload_result = cloudinary.uploader.upload(io.BytesIO(image_bytes), folder=folder)
+    return upload_result['secure_url']
+
+class UploadJob:
+    """State of one queued upload"""
+
+    def __init__(self, upload_id, image_bytes, folder, mimetype):
+        self.upload_id = upload_id
+        self.image_bytes = image_bytes
+        self.folder = folder
+        self.mimetype = mimetype
+        self.status = 'pending'
+        self.secure_url = None
+        self.error = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'status': self.status,
+            'secure_url': self.secure_url,
+            'error': self.error,
+            'attempts': self.attempts
+        }
+
+class UploadQueue:
+    """Bounded queue of image uploads drained by a pool of worker threads"""
+
+    def __init__(self, uploader=cloudinary_upload, workers=UPLOAD_WORKERS, max_size=UPLOAD_QUEUE_SIZE,
+                 max_attempts=UPLOAD_MAX_ATTEMPTS, backoff=UPLOAD_BACKOFF_SECONDS,
+                 max_tracked_jobs=UPLOAD_MAX_TRACKED_JOBS, collection=None):
+        self.uploader = uploader
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_tracked_jobs = max_tracked_jobs
+        self.collection = collection
+        self._queue = queue.Queue(maxsize=max_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _get_collection(self):
+        if self.collection is not None:
+            return self.collection
+        return get_db().upload_jobs
+
+    def _save(self, job, initial=False):
+        # Job state is shared through MongoDB so a poll served by another worker process still finds it
+        try:
+            state = job.to_dict()
+            state.pop('upload_id')
+            state['updated_at'] = datetime.now()
+            created = {'created_at': datetime.fromtimestamp(job.created_at)}
+            
+            # The initial save only inserts, so it never overwrites a result a fast worker already saved
+            update = {'$setOnInsert': {**state, **created}} if initial else {'$set': state, '$setOnInsert': created}
+            self._get_collection().update_one({'_id': job.upload_id}, update, upsert=True)
+        except Exception as e:
+            print(f"Error saving upload job: {str(e)}")
+
+    def _ensure_workers(self):
+        # Workers are started on first use so importing the module stays cheap
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"upload-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, image_bytes, folder="qr_codes", mimetype="image/png"):
+        """Queue an upload and return its job, or None when the queue is full"""
+        self._ensure_workers()
+        job = UploadJob(uuid.uuid4().hex, image_bytes, folder, mimetype)
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return None
+
+        with self._lock:
+            self._jobs[job.upload_id] = job
+            self._prune_jobs()
+
+        self._save(job, initial=True)
+        return job
+
+    def get(self, upload_id):
+        """Get a tracked upload job by id"""
+        with self._lock:
+            return self._jobs.get(upload_id)
+
+    def find(self, upload_id):
+        """Get the stored state of an upload queued by any worker process, or None"""
+        try:
+            state = self._get_collection().find_one(
+                {'_id': upload_id}, {'status': 1, 'secure_url': 1, 'error': 1, 'attempts': 1}
+            )
+        except Exception as e:
+            print(f"Error reading upload job: {str(e)}")
+            return None
+
+        if not state:
+            return None
+        state['upload_id'] = state.pop('_id')
+        return state
+
+    def _prune_jobs(self):
+        # Forget the oldest finished jobs once too many are tracked
+        while len(self._jobs) > self.max_tracked_jobs:
+            oldest_id = next(iter(self._jobs))
+            if not self._jobs[oldest_id].done.is_set():
+                break
+            self._jobs.pop(oldest_id)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self.in_flight += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._queue.task_done()
+
+    def _run(self, job):
+        while True:
+            job.attempts += 1
+            try:
+                job.secure_url = self.uploader(job.image_bytes, job.folder, job.mimetype)
+                job.status = 'done'
+                job.error = None
+                with self._lock:
+                    self.completed += 1
+                break
+            except Exception as e:
+                job.error = str(e)
+                if job.attempts >= self.max_attempts:
+                    print(f"Error uploading to Cloudinary: {str(e)}")
+                    job.status = 'failed'
+                    with self._lock:
+                        self.failed += 1
+                    break
+
+                # Exponential backoff before the next attempt
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff * (2 ** (job.attempts - 1)))
+
+        # The bytes are no longer needed once the upload has settled
+        job.image_bytes = None
+        job.finished_at = time.time()
+        self._save(job)
+        job.done.set()
+
+    def join(self):
+        """Block until every queued upload has settled"""
+        self._queue.join()
+
+    def stats(self):
+        """Get queue depth and outcome counters"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retries': self.retries,
+                'rejected': self.rejected,
+                'workers': self.workers,
+                'max_size': self._queue.maxsize
+            }
+
+# Process-wide upload queue
+upload_queue = UploadQueue()
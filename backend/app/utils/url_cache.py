@@ -0,0 +1,98 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Redirect cache settings
+REDIRECT_CACHE_MAX_ENTRIES = int(os.getenv('REDIRECT_CACHE_MAX_ENTRIES', 100000))
+REDIRECT_CACHE_TTL = float(os.getenv('REDIRECT_CACHE_TTL', 300))
+
+# Shorten dedup cache settings; the TTL bounds how long another worker's edit can go unseen
+SHORTEN_CACHE_MAX_ENTRIES = int(os.getenv('SHORTEN_CACHE_MAX_ENTRIES', 100000))
+SHORTEN_CACHE_TTL = float(os.getenv('SHORTEN_CACHE_TTL', 60))
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed time to live"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value for a key, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache a value, evicting least recently used entries when full"""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop a key so the next read goes back to the database"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.expirations = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl
+            }
+
+# Process-wide short_id -> original_url cache used by redirects
+redirect_cache = TTLCache(REDIRECT_CACHE_MAX_ENTRIES, REDIRECT_CACHE_TTL)
+
+# Process-wide canonical original URL -> short URL cache used by /shorten
+shorten_cache = TTLCache(SHORTEN_CACHE_MAX_ENTRIES, SHORTEN_CACHE_TTL)
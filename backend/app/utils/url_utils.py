@@ -0,0 +1,32 @@
+from urllib.parse import urlsplit, urlunsplit
+
+# Ports that are implied by the scheme and dropped from canonical URLs
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def normalize_url(url):
+    """Canonical form of a URL used to spot repeat shorten requests"""
+    # Only differences that cannot change the destination are removed; query and fragment are kept
+    url = url.strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        # Leave URLs the parser rejects untouched
+        return url
+
+    # IPv6 literals keep their brackets
+    netloc = f"[{host}]" if ':' in host else host
+    if parts.username or parts.password:
+        userinfo = parts.username or ''
+        if parts.password:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{port}"
+
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
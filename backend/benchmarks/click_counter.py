@@ -0,0 +1,69 @@
+"""Compare MongoDB writes per click for direct $inc and the write-behind click buffer
+
+Uses mongomock when installed, otherwise the database from MONGODB_URI.
+Run from the backend directory:
+    python -m benchmarks.click_counter
+"""
+import time
+import random
+from app.utils.click_buffer import ClickCounterBuffer
+
+def get_collection():
+    try:
+        import mongomock
+        return mongomock.MongoClient()['click_bench'].short_urls
+    except ImportError:
+        from app.utils.db_utils import get_db
+        return get_db().click_bench_short_urls
+
+class CountingCollection:
+    """Wrap a collection and count the write operations sent to it"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.write_ops = 0
+
+    def update_one(self, *args, **kwargs):
+        self.write_ops += 1
+        return self.collection.update_one(*args, **kwargs)
+
+    def bulk_write(self, requests, **kwargs):
+        self.write_ops += 1
+        return self.collection.bulk_write(requests, **kwargs)
+
+def click_storm(clicks, short_ids):
+    # A few viral links take most of the traffic
+    weights = [1 / (rank + 1) for rank in range(len(short_ids))]
+    return random.choices(short_ids, weights=weights, k=clicks)
+
+def run(clicks=50000, links=200, flush_threshold=1000):
+    collection = get_collection()
+    collection.delete_many({})
+    short_ids = [f"bench{i}" for i in range(links)]
+    collection.insert_many([{'short_id': short_id, 'scans': 0} for short_id in short_ids])
+    storm = click_storm(clicks, short_ids)
+
+    direct = CountingCollection(collection)
+    start = time.perf_counter()
+    for short_id in storm:
+        direct.update_one({'short_id': short_id}, {'$inc': {'scans': 1}})
+    direct_seconds = time.perf_counter() - start
+
+    buffered = CountingCollection(collection)
+    buffer = ClickCounterBuffer(flush_interval=0, flush_threshold=flush_threshold, collection=buffered)
+    start = time.perf_counter()
+    for short_id in storm:
+        buffer.record(short_id)
+    buffer.flush()
+    buffered_seconds = time.perf_counter() - start
+
+    total = sum(doc['scans'] for doc in collection.find({}, {'scans': 1}))
+    assert total == 2 * clicks, total
+
+    print(f"{clicks} clicks over {links} links")
+    print(f"{'mode':<10}{'write ops':>12}{'docs updated':>14}{'clicks/s':>14}")
+    print(f"{'direct':<10}{direct.write_ops:>12}{clicks:>14}{clicks / direct_seconds:>14.0f}")
+    print(f"{'buffered':<10}{buffered.write_ops:>12}{buffer.writes:>14}{clicks / buffered_seconds:>14.0f}")
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,66 @@
+"""Compare counter round trips per short ID for per-link and block-reserved allocation
+
+Uses mongomock when installed, otherwise the database from MONGODB_URI.
+Run from the backend directory:
+    python -m benchmarks.id_allocator
+"""
+import time
+import threading
+from app.utils.id_allocator import BlockIdAllocator
+
+def get_collection():
+    try:
+        import mongomock
+        return mongomock.MongoClient()['id_bench'].counters
+    except ImportError:
+        from app.utils.db_utils import get_db
+        return get_db().id_bench_counters
+
+class CountingCollection:
+    """Wrap a collection and count the counter updates sent to it"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.round_trips = 0
+
+    def find_one_and_update(self, *args, **kwargs):
+        self.round_trips += 1
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+def allocate(allocator, ids_per_thread, threads):
+    issued = []
+    lock = threading.Lock()
+
+    def work():
+        local = [allocator.next_id() for _ in range(ids_per_thread)]
+        with lock:
+            issued.extend(local)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return issued
+
+def run(ids_per_thread=5000, threads=8):
+    collection = get_collection()
+    total = ids_per_thread * threads
+    print(f"{total} IDs from {threads} threads")
+    print(f"{'block size':<12}{'round trips':>12}{'ids/s':>12}{'longest id':>12}")
+
+    for block_size in (1, 100, 1000):
+        collection.delete_many({})
+        counting = CountingCollection(collection)
+        # Each block size shares one counter document, as separate processes would
+        allocator = BlockIdAllocator(counter_name='bench', block_size=block_size, collection=counting)
+
+        start = time.perf_counter()
+        issued = allocate(allocator, ids_per_thread, threads)
+        elapsed = time.perf_counter() - start
+
+        assert len(set(issued)) == total, "duplicate IDs issued"
+        print(f"{block_size:<12}{counting.round_trips:>12}{total / elapsed:>12.0f}{max(map(len, issued)):>12}")
+
+if __name__ == '__main__':
+    run()
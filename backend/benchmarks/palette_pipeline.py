@@ -0,0 +1,37 @@
+"""Compare PNG size and render latency of the RGB and palette QR pipelines
+
+Run from the backend directory:
+    python -m benchmarks.palette_pipeline
+"""
+import io
+import time
+from app.utils.qr_utils import generate_qr_code, add_frame_and_text
+
+CASES = [
+    ('plain', None),
+    ('square frame', 'square'),
+    ('rounded frame', 'rounded'),
+]
+
+def render(data, frame_style, palette):
+    qr_img = generate_qr_code(data, error_correction='H', box_size=10, palette=palette)
+    if frame_style:
+        qr_img = add_frame_and_text(qr_img, '#4CAF50', '', '#FFFFFF', frame_style=frame_style, palette=palette)
+    buffered = io.BytesIO()
+    qr_img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+def run(data='https://example.com/' + 'x' * 300, repeat=20):
+    print(f"{'case':<16}{'mode':<10}{'bytes':>10}{'ms':>10}")
+    for name, frame_style in CASES:
+        for palette in (False, True):
+            render(data, frame_style, palette)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                png = render(data, frame_style, palette)
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+            mode = 'palette' if palette else 'rgb'
+            print(f"{name:<16}{mode:<10}{len(png):>10}{elapsed:>10.2f}")
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,85 @@
+"""Compare sequential, circuit-broken and raced URL shortening against local stand-in shortener servers
+
+Each stand-in answers after a fixed delay, or fails, so a degraded provider can be simulated
+without touching the real services. Run from the backend directory:
+    python -m benchmarks.shortener_race
+"""
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.utils.shortener_providers import ShortenerProvider, ShortenerRacer, shortener_client
+from app.utils.circuit_breaker import CircuitBreaker
+
+def start_stand_in(name, delay, status=200):
+    """Serve a fake shortener API on a free local port"""
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real services, so pooled connections can be reused
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = f"http://{name}.test/abc" if status == 200 else "error"
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/create?url={{url}}"
+
+def run(requests_per_mode=20, timeout=2):
+    # The first provider is degraded: slow and failing, as when an upstream is having an outage
+    stand_ins = [('slow-failing', 0.5, 503), ('fast', 0.02, 200), ('medium', 0.1, 200)]
+    servers = []
+    templates = []
+    for name, delay, status in stand_ins:
+        server, template = start_stand_in(name, delay, status)
+        servers.append(server)
+        templates.append((name, template))
+
+    print(f"{requests_per_mode} requests per mode; providers: "
+          + ', '.join(f"{name} ({delay * 1000:.0f}ms, {status})" for name, delay, status in stand_ins))
+    print(f"{'mode':<20}{'total s':>10}{'avg ms':>10}{'p95 ms':>10}  winners")
+
+    # A breaker that never opens stands in for the old behaviour
+    modes = [('sequential', 'sequential', 10 ** 9), ('sequential+breaker', 'sequential', 3), ('race+breaker', 'race', 3)]
+    for label, mode, failure_threshold in modes:
+        # Fresh providers so each mode starts without latency history
+        providers = [ShortenerProvider(name, template, CircuitBreaker(failure_threshold, reset_timeout=60))
+                     for name, template in templates]
+        racer = ShortenerRacer(providers, mode=mode, timeout=timeout)
+        # Sequential modes keep the configured order so the degraded provider is tried first, as before
+        if mode == 'sequential':
+            racer.ranked = lambda providers=providers: providers
+
+        latencies = []
+        winners = {}
+        start = time.perf_counter()
+        for i in range(requests_per_mode):
+            request_start = time.perf_counter()
+            short_url, winner = racer.shorten(f"https://example.com/{i}")
+            latencies.append(time.perf_counter() - request_start)
+            assert short_url, winner
+            winners[winner] = winners.get(winner, 0) + 1
+        total = time.perf_counter() - start
+
+        p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+        print(f"{label:<20}{total:>10.2f}{sum(latencies) / len(latencies) * 1000:>10.0f}"
+              f"{p95 * 1000:>10.0f}  {winners}")
+        for stats in racer.stats()['providers']:
+            print(f"  {stats['name']:<14} requests={stats['requests']:<4} errors={stats['errors']:<4} "
+                  f"avg_latency={(stats['avg_latency'] or 0) * 1000:.0f}ms breaker={stats['breaker']['state']}")
+
+    stats = shortener_client.stats()
+    print(f"pooled connections: {stats['requests']} requests, reuse ratio {stats['reuse_ratio']:.2f}")
+
+    for server in servers:
+        server.shutdown()
+
+if __name__ == '__main__':
+    run()
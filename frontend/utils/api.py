@@ -1,4 +1,4 @@
-import requests
+from frontend.utils.http_client import http_client
 import os
 import json
 from dotenv import load_dotenv
@@ -33,7 +33,7 @@ def generate_qr_code(data, options=None):
             "data": data,
             "options": options or {}
         }
-        response = requests.post(
+        response = http_client.post(
             get_api_url("qr/generate"),
             json=payload
         )
@@ -46,7 +46,7 @@ def get_qr_analytics(qr_id=None):
     """Get QR code analytics data"""
     try:
         endpoint = f"analytics/{qr_id}" if qr_id else "analytics"
-        response = requests.get(get_api_url(endpoint))
+        response = http_client.get(get_api_url(endpoint))
         return handle_response(response)
     except Exception as e:
         print(f"Error getting analytics: {str(e)}")
@@ -57,7 +57,7 @@ def create_short_url_api(url):
     """Create short URL via API"""
     try:
         payload = {"url": url}
-        response = requests.post(
+        response = http_client.post(
             get_api_url("url/shorten"),
             json=payload
         )
@@ -69,7 +69,7 @@ def create_short_url_api(url):
 def get_all_short_urls_api():
     """Get all shortened URLs via API"""
     try:
-        response = requests.get(get_api_url("url/all"))
+        response = http_client.get(get_api_url("url/all"))
         return handle_response(response)
     except Exception as e:
         print(f"Error getting short URLs: {str(e)}")
@@ -79,7 +79,7 @@ def update_short_url_api(short_id, new_url):
     """Update short URL destination via API"""
     try:
         payload = {"new_url": new_url}
-        response = requests.put(
+        response = http_client.put(
             get_api_url(f"url/{short_id}"),
             json=payload
         )
@@ -93,7 +93,7 @@ def upload_image_api(image_data):
     """Upload image to Cloudinary via API"""
     try:
         files = {'image': image_data}
-        response = requests.post(
+        response = http_client.post(
             get_api_url("upload/image"),
             files=files
         )
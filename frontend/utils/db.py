@@ -1,7 +1,10 @@
 import os
+import time
 import pymongo
 from datetime import datetime
 from dotenv import load_dotenv
+from frontend.utils.device_utils import classify_user_agent, DEVICE_FIELDS
+from frontend.utils.url_utils import normalize_url
 
 # Load environment variables
 load_dotenv()
@@ -10,6 +13,22 @@ load_dotenv()
 MONGODB_URI = os.getenv('MONGODB_URI')
 DB_NAME = os.getenv('DB_NAME', 'qr_database')
 
+# Path of links served by the backend's /redirect route rather than an external shortener
+LOCAL_REDIRECT_PATH = '/api/url/redirect/'
+
+# Rollup counter retries, shared with the backend's scan queue settings
+SCAN_MAX_ATTEMPTS = int(os.getenv('SCAN_MAX_ATTEMPTS', 3))
+SCAN_BACKOFF_SECONDS = float(os.getenv('SCAN_BACKOFF_SECONDS', 0.5))
+
+# Display format for stored dates, matching the backend API
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def format_timestamp(value):
+    """Format a stored date for display; legacy string timestamps pass through"""
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
 # Initialize MongoDB client
 def get_db_client():
     """Get MongoDB client"""
@@ -56,7 +75,8 @@ def init_url_db():
 # Analytics functions
 def log_qr_scan(qr_id, user_agent=None, ip_address=None):
     """Log QR code scan to database"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Native dates, as the backend writes them, so range queries and keyset paging see every scan
+    timestamp = datetime.now()
     
     try:
         client = get_db_client()
@@ -64,19 +84,45 @@ def log_qr_scan(qr_id, user_agent=None, ip_address=None):
             return False
         
         db = client[DB_NAME]
-        db.qr_scans.insert_one({
-            'id': qr_id,
+        
+        # Same document shape as the backend's scans, so its analytics and rollups see this one
+        scan = {
+            'qr_id': qr_id,
             'url': "",
             'timestamp': timestamp,
             'user_agent': user_agent,
-            'ip_address': ip_address
-        })
+            'ip_address': ip_address,
+            # Classified once here, with the same rules as the backend
+            **classify_user_agent(user_agent)
+        }
+        db.qr_scans.insert_one(scan)
+        record_scan_rollup(db, scan)
         
         return True
     except Exception as e:
         print(f"Error logging scan: {str(e)}")
         return False
 
+def record_scan_rollup(db, scan):
+    """Add a stored scan to its per-(qr_id, day, device) rollup counter, retrying with backoff"""
+    timestamp = scan['timestamp']
+    key = {
+        'qr_id': scan['qr_id'],
+        'day': datetime(timestamp.year, timestamp.month, timestamp.day),
+        'device': scan['device']
+    }
+    
+    for attempt in range(SCAN_MAX_ATTEMPTS):
+        try:
+            db.qr_scan_rollups.update_one(key, {'$inc': {'count': 1}}, upsert=True)
+            return True
+        except Exception as e:
+            print(f"Error updating scan rollup: {str(e)}")
+            if attempt + 1 < SCAN_MAX_ATTEMPTS:
+                time.sleep(SCAN_BACKOFF_SECONDS * (2 ** attempt))
+    
+    return False
+
 def get_analytics_data():
     """Get analytics data from database"""
     try:
@@ -90,13 +136,16 @@ def get_analytics_data():
         if 'qr_scans' not in db.list_collection_names():
             init_analytics_db()
             # Add sample data for testing
-            db.qr_scans.insert_one({
-                'id': 'test_id',
+            scan = {
+                'qr_id': 'test_id',
                 'url': 'https://example.com',
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'timestamp': datetime.now(),
                 'user_agent': 'Mozilla/5.0',
-                'ip_address': '127.0.0.1'
-            })
+                'ip_address': '127.0.0.1',
+                **classify_user_agent('Mozilla/5.0')
+            }
+            db.qr_scans.insert_one(scan)
+            record_scan_rollup(db, scan)
         
         # Get data
         rows = list(db.qr_scans.find().sort('timestamp', -1))
@@ -104,23 +153,20 @@ def get_analytics_data():
         # Process data
         data = []
         for row in rows:
-            # Extract device info from user agent
-            device = "Unknown"
-            if row.get('user_agent'):
-                if "Mobile" in str(row.get('user_agent')):
-                    device = "Mobile"
-                elif "Tablet" in str(row.get('user_agent')):
-                    device = "Tablet"
-                else:
-                    device = "Desktop"
+            # Scans logged before ingest-time classification are classified here
+            if 'device' in row:
+                classification = {field: row.get(field, "Unknown") for field in DEVICE_FIELDS}
+            else:
+                classification = classify_user_agent(row.get('user_agent'))
             
             data.append({
-                'qr_id': row.get('id'),
+                # Scans logged by older frontends stored the id under 'id'
+                'qr_id': row.get('qr_id', row.get('id')),
                 'url': row.get('url'),
-                'timestamp': row.get('timestamp'),
+                'timestamp': format_timestamp(row.get('timestamp')),
                 'user_agent': row.get('user_agent'),
                 'ip_address': row.get('ip_address'),
-                'device': device
+                **classification
             })
         
         return data
@@ -131,7 +177,7 @@ def get_analytics_data():
 # URL Shortener database functions
 def store_short_url(short_id, original_url, short_url=None):
     """Store a short URL in the database"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = datetime.now()
     
     try:
         client = get_db_client()
@@ -144,6 +190,8 @@ def store_short_url(short_id, original_url, short_url=None):
             {'$set': {
                 'short_id': short_id,
                 'original_url': original_url,
+                # Lets the backend's /shorten reuse this link for repeat requests
+                'canonical_url': normalize_url(original_url),
                 'created_at': timestamp,
                 'scans': 0,
                 'short_url': short_url
@@ -190,7 +238,7 @@ def get_all_short_urls():
         db = client[DB_NAME]
         short_urls = list(db.short_urls.find().sort('created_at', -1))
         
-        return [(url.get('short_id'), url.get('original_url'), url.get('created_at'), 
+        return [(url.get('short_id'), url.get('original_url'), format_timestamp(url.get('created_at')), 
                 url.get('scans'), url.get('short_url')) for url in short_urls]
     except Exception as e:
         print(f"Error retrieving short URLs: {str(e)}")
@@ -204,9 +252,16 @@ def update_original_url(short_id, new_url):
             return False
         
         db = client[DB_NAME]
+        
+        # External short links keep redirecting to the old destination, so only backend links
+        # answer for the new one; null rather than $unset so the canonical_url backfill skips them
+        current = db.short_urls.find_one({'short_id': short_id}, {'short_url': 1}) or {}
+        is_local = LOCAL_REDIRECT_PATH in (current.get('short_url') or '')
+        canonical_url = normalize_url(new_url) if is_local else None
+        
         db.short_urls.update_one(
             {'short_id': short_id},
-            {'$set': {'original_url': new_url}}
+            {'$set': {'original_url': new_url, 'canonical_url': canonical_url}}
         )
         
         return True
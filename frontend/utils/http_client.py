@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Outbound HTTP settings
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 10))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.2))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
+# Gateway errors worth retrying; only idempotent methods are retried
+RETRY_STATUSES = (502, 503, 504)
+
+class HTTPClient:
+    """Thread-safe outbound HTTP client with keep-alive connection pools per host"""
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_retries=HTTP_MAX_RETRIES, backoff=HTTP_RETRY_BACKOFF,
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)):
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False
+        )
+        # One adapter owns the pools; every thread's session mounts it so connections are shared
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    @property
+    def session(self):
+        """Get this thread's session; sessions keep cookies apart while sharing the pools"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session, applying the default timeout"""
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.total_seconds += time.perf_counter() - start
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def stats(self):
+        """Get request counters and per-host connection reuse"""
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            # urllib3 counts every request and every new connection made by a pool
+            hosts[host] = {
+                'requests': pool.num_requests,
+                'connections': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0),
+                'idle': pool.pool.qsize() if pool.pool else 0
+            }
+
+        total_requests = sum(host['requests'] for host in hosts.values())
+        total_reused = sum(host['reused'] for host in hosts.values())
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_seconds': self.total_seconds / self.requests if self.requests else 0.0,
+                'reuse_ratio': total_reused / total_requests if total_requests else 0.0,
+                'hosts': hosts
+            }
+
+# Process-wide outbound HTTP client
+http_client = HTTPClient()
@@ -1,4 +1,5 @@
 import qrcode
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageOps
 import io
 import base64
@@ -23,7 +24,7 @@ cloudinary.config(
     api_secret=os.getenv('CLOUDINARY_API_SECRET')
 )
 
-def generate_qr_code(data, error_correction=qrcode.constants.ERROR_CORRECT_M, version=None, box_size=10, border=4):
+def generate_qr_code(data, error_correction=qrcode.constants.ERROR_CORRECT_M, version=None, box_size=10, border=4, renderer='pil'):
     """Generate QR code with specified error correction and parameters"""
     qr = qrcode.QRCode(
         version=version,
@@ -34,6 +35,9 @@ def generate_qr_code(data, error_correction=qrcode.constants.ERROR_CORRECT_M, ve
     qr.add_data(data)
     qr.make(fit=True)
     
+    if renderer == 'numpy':
+        return render_qr_matrix(qr)
+    
     img = qr.make_image(fill_color="black", back_color="white")
     # Ensure the image is in PIL Image format
     if not isinstance(img, Image.Image):
@@ -41,6 +45,20 @@ def generate_qr_code(data, error_correction=qrcode.constants.ERROR_CORRECT_M, ve
     
     return img
 
+def render_qr_matrix(qr):
+    """Rasterize a built QRCode from its module matrix with NumPy upscaling"""
+    # get_matrix() already includes the quiet zone border modules
+    modules = np.asarray(qr.get_matrix(), dtype=bool)
+    
+    # Dark modules are black (0) and light modules white (255)
+    pixels = np.where(modules, np.uint8(0), np.uint8(255))
+    
+    # Scale every module up to a box_size x box_size block
+    pixels = pixels.repeat(qr.box_size, axis=0).repeat(qr.box_size, axis=1)
+    
+    # Same output as the PIL factory path: black on white, converted to RGB
+    return Image.fromarray(pixels).convert('RGB')
+
 def add_logo_to_qr(qr_img, logo_img, size_ratio=0.2, position='center', shape='square', border=True, border_color='white', opacity=1.0):
     """Add logo to QR code with advanced customization"""
     # Convert to RGBA if not already
@@ -1,4 +1,4 @@
-import requests
+from frontend.utils.http_client import http_client
 import uuid
 import hashlib
 from datetime import datetime
@@ -26,7 +26,7 @@ def create_short_url(url):
     # Option 1: TinyURL API
     try:
         tinyurl_api = f"https://tinyurl.com/api-create.php?url={quote(url)}"
-        response = requests.get(tinyurl_api, timeout=5)
+        response = http_client.get(tinyurl_api, timeout=5)
         if response.status_code == 200:
             short_url = response.text.strip()
     except Exception as e:
@@ -36,7 +36,7 @@ def create_short_url(url):
     if not short_url:
         try:
             isgd_api = f"https://is.gd/create.php?format=simple&url={quote(url)}"
-            response = requests.get(isgd_api, timeout=5)
+            response = http_client.get(isgd_api, timeout=5)
             if response.status_code == 200:
                 short_url = response.text.strip()
         except Exception as e:
@@ -46,7 +46,7 @@ def create_short_url(url):
     if not short_url:
         try:
             vgd_api = f"https://v.gd/create.php?format=simple&url={quote(url)}"
-            response = requests.get(vgd_api, timeout=5)
+            response = http_client.get(vgd_api, timeout=5)
             if response.status_code == 200:
                 short_url = response.text.strip()
         except Exception as e: